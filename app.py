@@ -1,28 +1,44 @@
-import io
+import argparse
+import atexit
+import csv
+import gzip
+import hashlib
+import heapq
+import itertools
 import logging
+import multiprocessing
 import random
 import re
+import signal
+import socket
+import sqlite3
+import tempfile
 import threading
 import time
 import urllib.parse
+import uuid
 import os
+import sys
+import queue
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from datetime import datetime
-from functools import wraps
-import pandas as pd
+from functools import cached_property, lru_cache, wraps
+from html.parser import HTMLParser
 import requests
 import usaddress
-from flask import Flask, jsonify, render_template, request, send_file
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.os_manager import ChromeType
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+# Selenium, webdriver_manager and pandas are imported where they are used, so HTTP-only batch runs never load them
+
+class By:
+    # Selenium's locator strings; importing selenium.webdriver.common.by would load all of Selenium
+    XPATH = "xpath"
+    CSS_SELECTOR = "css selector"
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 app = Flask(__name__)
@@ -30,35 +46,723 @@ app = Flask(__name__)
 SESSIONS = {}
 SESSIONS_LOCK = threading.Lock()
 MAX_CONCURRENT_SESSIONS = 20
+# Idle sessions leave memory after SESSION_TTL seconds, or least recently used first beyond MAX_SESSIONS;
+# their state, links and rows stay in the job store
+SESSION_TTL = int(os.environ.get("SESSION_TTL", 3600))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 100))
+SESSION_SWEEP_INTERVAL = 60
+_last_sweep = 0.0
+
+def new_enrichment_stats():
+    # Per job: how often each enrichment stage ran and which stage produced the final email
+    return {"businesses": 0, "ran": {}, "resolved": {}}
+
+class SessionState:
+    # One session's in-memory job state. Fixed slots keep it small and make a misspelt key an error;
+    # item access and update()/items() keep the dict-style call sites working
+    __slots__ = ("scraping_active", "stop_scraping_flag", "status_message", "link_collection_progress", "detail_scraping_progress",
+                 "link_count", "scraped_count", "total_to_scrape", "results", "collected_links", "link_index", "link_matches",
+                 "wait_seconds", "links_complete", "phase", "version", "detail_started", "detail_finished", "scraped_at_start",
+                 "stage_timings", "remote", "enrichment_stats", "governor", "sink", "run", "lock", "last_access")
+
+    def __init__(self):
+        self.scraping_active, self.stop_scraping_flag, self.status_message = False, False, "Ready!"
+        self.link_collection_progress, self.detail_scraping_progress = 0.0, 0.0
+        self.link_count, self.scraped_count, self.total_to_scrape = 0, 0, 0
+        self.results, self.collected_links, self.link_index, self.link_matches = [], [], {}, {}
+        self.wait_seconds, self.links_complete = 0.0, False
+        self.phase, self.version, self.detail_started, self.detail_finished, self.scraped_at_start = "idle", 0, None, None, 0
+        self.stage_timings, self.remote, self.enrichment_stats, self.governor = {}, None, new_enrichment_stats(), new_governor_stats()
+        # sink(row), when set, receives every result instead of self.results (headless runs stream rows straight to a file)
+        self.sink = None
+        # run is a token for the scraping_worker that owns this state, so an ending job only cleans up after itself
+        self.run = None
+        self.lock = threading.Condition()
+        self.last_access = time.monotonic()
+
+    def __getitem__(self, key):
+        try: return getattr(self, key)
+        except AttributeError: raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try: setattr(self, key, value)
+        except AttributeError: raise KeyError(key) from None
+
+    def update(self, values=(), **kwargs):
+        for key, value in dict(values, **kwargs).items(): self[key] = value
+
+    def items(self): return [(key, getattr(self, key)) for key in self.__slots__]
 
 def get_session(session_id):
+    global _last_sweep
+    now = time.monotonic()
     with SESSIONS_LOCK:
-        if session_id not in SESSIONS:
-            SESSIONS[session_id] = {
-                "scraping_active": False, "stop_scraping_flag": False, "status_message": "Ready!",
-                "link_collection_progress": 0.0, "detail_scraping_progress": 0.0,
-                "link_count": 0, "scraped_count": 0, "total_to_scrape": 0,
-                "results_df": pd.DataFrame(), "collected_links": [],
-                "lock": threading.Lock()
-            }
-        return SESSIONS[session_id]
-EMAIL_REGEX = re.compile(r"[a-zA-Z0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}")
+        if now - _last_sweep > SESSION_SWEEP_INTERVAL or (session_id not in SESSIONS and len(SESSIONS) >= MAX_SESSIONS):
+            _last_sweep = now
+            evict_sessions(now, keep=session_id)
+        if session_id not in SESSIONS: SESSIONS[session_id] = SessionState()
+        session = SESSIONS[session_id]
+        session.last_access = now
+        return session
+
+def evict_sessions(now, keep=None):
+    # Caller holds SESSIONS_LOCK. Running and queued jobs (scraping_active, or still in the scheduler) are never evicted
+    idle = sorted((s.last_access, sid) for sid, s in SESSIONS.items() if sid != keep and not s.scraping_active and sid not in SCHEDULER.running)
+    expired = [sid for seen, sid in idle if now - seen > SESSION_TTL]
+    overflow = [sid for _, sid in idle if sid not in expired][:max(0, len(SESSIONS) - len(expired) - MAX_SESSIONS + 1)]
+    for sid in expired + overflow: del SESSIONS[sid]
+    if expired or overflow: logging.info(f"Evicted {len(expired)} expired and {len(overflow)} least recently used sessions")
+
+def sessions_stats():
+    with SESSIONS_LOCK: current = list(SESSIONS.values())
+    return {"count": len(current), "active": sum(s.scraping_active for s in current), "max": MAX_SESSIONS}
+
+def session_memory(session):
+    # Approximate bytes held in memory: the rows, links and match sets, with their strings
+    size = sys.getsizeof(session)
+    with session["lock"]:
+        for row in session["results"]: size += sys.getsizeof(row) + sum(map(sys.getsizeof, row.values()))
+        for link in session["collected_links"]: size += sys.getsizeof(link) + sum(map(sys.getsizeof, link))
+        size += sys.getsizeof(session["link_index"]) + sum(map(sys.getsizeof, session["link_index"]))
+        size += sys.getsizeof(session["link_matches"]) + sum(map(sys.getsizeof, session["link_matches"].values()))
+    return size
 PHONE_REGEX = re.compile(r'(\+?\d[\d\s\-\(\)]{8,})')
 USER_AGENTS = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"]
 DATA_DIR = "scraper_data"
 if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
 
-def update_status(session_id, message, link_progress=None, detail_progress=None, link_count=None, scraped_count=None, total_to_scrape=None):
+def update_status(session_id, message, link_progress=None, detail_progress=None, link_count=None, scraped_count=None, total_to_scrape=None, phase=None):
     session = get_session(session_id)
     with session["lock"]:
         session["status_message"] = message
+        session["version"] += 1
+        if phase is not None: session["phase"] = phase
         if link_progress is not None: session["link_collection_progress"] = link_progress
         if detail_progress is not None: session["detail_scraping_progress"] = detail_progress
         if link_count is not None: session["link_count"] = link_count
         if scraped_count is not None: session["scraped_count"] = scraped_count
         if total_to_scrape is not None: session["total_to_scrape"] = total_to_scrape
+        session["lock"].notify_all()
+    checkpoint_session(session_id)
+
+CACHE_PATH = os.path.join(DATA_DIR, "cache.sqlite3")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_MB", 256)) * 1024 * 1024
+CACHE_TTLS = {"place": 7 * 86400, "website": 14 * 86400, "facebook": 14 * 86400, "address": 90 * 86400}
+CACHE_NEGATIVE_TTL = 86400
+
+class ResultCache:
+    # SQLite-backed (kind, key) -> JSON cache with per-kind TTLs and LRU eviction once the file passes max_bytes
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttls=CACHE_TTLS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.lock = threading.Lock()
+        self.conn = None
+        self.approx_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _db(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache (kind TEXT, key TEXT, value TEXT, size INTEGER, expires REAL, accessed REAL, PRIMARY KEY (kind, key))")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self.approx_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        return self.conn
+
+    def get(self, kind, key):
+        if not key: return None
+        now = time.time()
+        with self.lock:
+            db = self._db()
+            row = db.execute("SELECT value, expires FROM cache WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row and row[1] > now:
+                db.execute("UPDATE cache SET accessed = ? WHERE kind = ? AND key = ?", (now, kind, key))
+                self.counters["hits"] += 1
+                return json.loads(row[0])
+            if row: db.execute("DELETE FROM cache WHERE kind = ? AND key = ?", (kind, key))
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, kind, key, value, empty=False):
+        if not key: return
+        blob = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", (kind, key, blob, len(blob), now + (CACHE_NEGATIVE_TTL if empty else self.ttls[kind]), now))
+            self.counters["writes"] += 1
+            self.approx_bytes += len(blob)
+            if self.approx_bytes > self.max_bytes: self._evict()
+
+    def _evict(self):
+        # Drop expired rows first, then least recently used until 90% of the budget
+        db = self.conn
+        self.counters["evictions"] += db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        target = self.max_bytes * 0.9
+        while total > target:
+            rows = db.execute("SELECT kind, key, size FROM cache ORDER BY accessed LIMIT 500").fetchall()
+            if not rows: break
+            for kind, key, size in rows:
+                db.execute("DELETE FROM cache WHERE kind = ? AND key = ?", (kind, key))
+                self.counters["evictions"] += 1
+                total -= size
+                if total <= target: break
+        self.approx_bytes = total
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, bytes=self.approx_bytes, max_bytes=self.max_bytes)
+
+RESULT_CACHE = ResultCache()
+
+# Website, Facebook and place entries are stored as {"depth": ..., "result": ...}. The depth is a flat dict of numbers
+# saying how thorough the run was, and an entry only serves runs asking for no more on any axis. So a "fast" or
+# HTTP-only result never stands in for a full one; older entries without a depth count as misses
+def cache_covers(hit, depth):
+    return isinstance(hit, dict) and isinstance(hit.get("depth"), dict) and all(hit["depth"].get(k, -1) >= v for k, v in depth.items())
+
+def cached_result(kind, key, depth):
+    hit = RESULT_CACHE.get(kind, key)
+    return hit["result"] if cache_covers(hit, depth) else None
+
+PLACE_ID_REGEX = re.compile(r'(ChIJ[a-zA-Z0-9_-]+)')
+CID_REGEX = re.compile(r'0x[0-9a-fA-F]+:0x([0-9a-fA-F]+)')
+
+def place_key(gmaps_url):
+    # The same place shows up under many queries with different URLs; the place ID or CID is stable
+    url = gmaps_url or ""
+    if m := PLACE_ID_REGEX.search(url): return m.group(1)
+    if m := CID_REGEX.search(url): return f"cid:{int(m.group(1), 16)}"
+    return url.split('?')[0]
+
+def domain_cache_key(url):
+    return (urllib.parse.urlsplit(url or "").hostname or "").removeprefix("www.")
+
+def page_cache_key(url):
+    # Host, port and path: sites on a shared host (sites.google.com/view/..., linktr.ee/..., host:port) stay apart
+    parts = urllib.parse.urlsplit(url or "")
+    try: port = f":{parts.port}" if parts.port else ""
+    except ValueError: port = ""
+    return f"{(parts.hostname or '').removeprefix('www.')}{port}{parts.path.rstrip('/').lower()}"
+
+JOBS_PATH = os.path.join(DATA_DIR, "jobs.sqlite3")
+SPILL_DIR = os.path.join(DATA_DIR, "spill")
+JOB_FLUSH_INTERVAL = 1.0
+JOB_HEARTBEAT_TIMEOUT = 120
+JOB_HEARTBEAT_INTERVAL = 10
+
+class JobStore:
+    # Durable job state shared by every gunicorn worker: status snapshot, collected links, finished queries and per-link results
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.last_flush = {}
+
+    def _db(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (session_id TEXT PRIMARY KEY, state TEXT, config TEXT, stop_requested INTEGER DEFAULT 0, updated REAL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS links (session_id TEXT, url TEXT, query TEXT, zipcode TEXT, seq INTEGER, PRIMARY KEY (session_id, url))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS queries (session_id TEXT, query TEXT, PRIMARY KEY (session_id, query))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS query_stats (session_id TEXT, query TEXT, stats TEXT, PRIMARY KEY (session_id, query))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS link_matches (session_id TEXT, place_key TEXT, query TEXT, zipcode TEXT, PRIMARY KEY (session_id, place_key, query))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS results (session_id TEXT, url TEXT, row TEXT, seq INTEGER, PRIMARY KEY (session_id, url))")
+            # Appends look up MAX(seq) per job and readers page by seq, so both stay index lookups as a job grows
+            self.conn.execute("CREATE INDEX IF NOT EXISTS links_seq ON links (session_id, seq)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_seq ON results (session_id, seq)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS spills (session_id TEXT PRIMARY KEY, path TEXT, rows INTEGER)")
+        return self.conn
+
+    def start(self, session_id, config):
+        with self.lock:
+            db = self._db()
+            for table in ("links", "link_matches", "queries", "query_stats", "results", "spills"): db.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, 0, ?)", (session_id, "{}", json.dumps(config), time.time()))
+        try: os.remove(self.spill_path(session_id))
+        except OSError: pass
+
+    def checkpoint(self, session_id, state, force=False):
+        # Throttled state flush; returns whether another worker asked this job to stop
+        now = time.time()
+        if not force and now - self.last_flush.get(session_id, 0) < JOB_FLUSH_INTERVAL: return False
+        self.last_flush[session_id] = now
+        with self.lock:
+            db = self._db()
+            db.execute("INSERT INTO jobs (session_id, state, config, updated) VALUES (?, ?, '{}', ?) ON CONFLICT (session_id) DO UPDATE SET state = excluded.state, updated = excluded.updated", (session_id, json.dumps(state), now))
+            row = db.execute("SELECT stop_requested FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return bool(row and row[0])
+
+    def request_stop(self, session_id):
+        with self.lock: self._db().execute("UPDATE jobs SET stop_requested = 1 WHERE session_id = ?", (session_id,))
+
+    def clear_stop(self, session_id):
+        with self.lock: self._db().execute("UPDATE jobs SET stop_requested = 0 WHERE session_id = ?", (session_id,))
+
+    def load_state(self, session_id):
+        with self.lock: row = self._db().execute("SELECT state, updated FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        if not row: return None
+        state = json.loads(row[0])
+        if state.get("scraping_active") and time.time() - row[1] > JOB_HEARTBEAT_TIMEOUT:
+            # The worker that owned this job died; report it as interrupted so it can be resumed
+            state.update(scraping_active=False, interrupted=True, status_message="Interrupted. Load progress to resume.")
+        return state
+
+    def load_config(self, session_id):
+        with self.lock: row = self._db().execute("SELECT config FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_links(self, session_id, links):
+        if not links: return
+        with self.lock:
+            db = self._db()
+            seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM links WHERE session_id = ?", (session_id,)).fetchone()[0]
+            db.executemany("INSERT OR IGNORE INTO links VALUES (?, ?, ?, ?, ?)", [(session_id, url, query, zipc, seq + i) for i, (url, query, zipc) in enumerate(links, 1)])
+
+    def load_links(self, session_id, offset=0, limit=-1):
+        with self.lock: return [tuple(r) for r in self._db().execute("SELECT url, query, zipcode FROM links WHERE session_id = ? ORDER BY seq LIMIT ? OFFSET ?", (session_id, limit, offset))]
+
+    def count_links(self, session_id):
+        with self.lock: return self._db().execute("SELECT COUNT(*) FROM links WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def add_link_matches(self, session_id, matches):
+        if not matches: return
+        with self.lock: self._db().executemany("INSERT OR IGNORE INTO link_matches VALUES (?, ?, ?, ?)", [(session_id, key, query, zipc) for key, query, zipc in matches])
+
+    def load_link_matches(self, session_id):
+        matches = {}
+        with self.lock:
+            for key, query, zipc in self._db().execute("SELECT place_key, query, zipcode FROM link_matches WHERE session_id = ?", (session_id,)):
+                matches.setdefault(key, set()).add((query, zipc))
+        return matches
+
+    def mark_query_done(self, session_id, query, stats=None):
+        with self.lock:
+            db = self._db()
+            db.execute("INSERT OR IGNORE INTO queries VALUES (?, ?)", (session_id, query))
+            if stats: db.execute("INSERT OR REPLACE INTO query_stats VALUES (?, ?, ?)", (session_id, query, json.dumps(stats)))
+
+    def load_query_stats(self, session_id):
+        with self.lock: return [json.loads(r[0]) for r in self._db().execute("SELECT stats FROM query_stats WHERE session_id = ? ORDER BY rowid", (session_id,))]
+
+    def done_queries(self, session_id):
+        with self.lock: return {r[0] for r in self._db().execute("SELECT query FROM queries WHERE session_id = ?", (session_id,))}
+
+    def add_result(self, session_id, url, row):
+        with self.lock:
+            db = self._db()
+            seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM results WHERE session_id = ?", (session_id,)).fetchone()[0]
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (session_id, url, json.dumps(row), seq + 1))
+
+    def load_results(self, session_id, since=0):
+        # Spilled rows come first, then rows added to the table since (resume restarts their seq at 1)
+        with self.lock:
+            db = self._db()
+            spilled = db.execute("SELECT rows FROM spills WHERE session_id = ?", (session_id,)).fetchone()
+            spilled = spilled[0] if spilled else 0
+            rows = [json.loads(r[0]) for r in db.execute("SELECT row FROM results WHERE session_id = ? AND seq > ? ORDER BY seq", (session_id, max(since - spilled, 0)))]
+        if since < spilled: rows = [row for _, row in self.read_spill(session_id, since, spilled)] + rows
+        return rows
+
+    def done_urls(self, session_id):
+        with self.lock:
+            db = self._db()
+            urls = {r[0] for r in db.execute("SELECT url FROM results WHERE session_id = ?", (session_id,))}
+            spilled = db.execute("SELECT rows FROM spills WHERE session_id = ?", (session_id,)).fetchone()
+        if spilled: urls.update(url for url, _ in self.read_spill(session_id, 0, spilled[0]))
+        return urls
+
+    def spill_path(self, session_id):
+        return os.path.join(SPILL_DIR, hashlib.sha1(session_id.encode()).hexdigest() + ".jsonl.gz")
+
+    def read_spill(self, session_id, start, stop):
+        # Only the first `stop` lines are committed; a spill being rewritten may have more
+        try:
+            with gzip.open(self.spill_path(session_id), "rt", encoding="utf-8") as f:
+                for line in itertools.islice(f, start, stop): yield tuple(json.loads(line))
+        except FileNotFoundError: return
+
+    def spill(self, session_id):
+        # Moves a finished job's rows out of the results table into one gzip JSONL file of [url, row] lines
+        with self.lock:
+            db = self._db()
+            spilled = db.execute("SELECT rows FROM spills WHERE session_id = ?", (session_id,)).fetchone()
+            spilled = spilled[0] if spilled else 0
+            fresh = db.execute("SELECT url, row, seq FROM results WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        if not fresh: return 0
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        path = self.spill_path(session_id)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=6) as f:
+            for url, row in self.read_spill(session_id, 0, spilled): f.write(json.dumps([url, row]) + "\n")
+            for url, row, _ in fresh: f.write(f"[{json.dumps(url)}, {row}]\n")
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT OR REPLACE INTO spills VALUES (?, ?, ?)", (session_id, path, spilled + len(fresh)))
+            db.execute("DELETE FROM results WHERE session_id = ? AND seq <= ?", (session_id, fresh[-1][2]))
+            db.execute("COMMIT")
+        return len(fresh)
+
+JOB_STORE = JobStore()
+
+def session_state(session):
+    state = {k: v for k, v in session.items() if k not in ["results", "lock", "collected_links", "link_index", "link_matches", "stage_timings", "last_access", "sink", "run"]}
+    state["timings"] = timing_summary(session["stage_timings"])
+    return state
+
+def checkpoint_session(session_id, force=False):
+    session = get_session(session_id)
+    with session["lock"]: state = session_state(session)
+    if JOB_STORE.checkpoint(session_id, state, force) and state["scraping_active"]:
+        with session["lock"]: session["stop_scraping_flag"] = True
+
+def append_result(session_id, url, row):
+    # Append-only: rows never move, so a row's index doubles as the /get-results cursor
+    session = get_session(session_id)
+    JOB_STORE.add_result(session_id, url, row)
+    if sink := session["sink"]: sink(row)
+    with session["lock"]:
+        if not sink: session["results"].append(row)
+        session["lock"].notify_all()
+
+def results_rows(session_id, since=0):
+    # Rows from this worker's memory, or from the job store when another worker (or a previous process) ran the job
+    session = get_session(session_id)
+    with session["lock"]:
+        if session["results"] or session["scraping_active"]: return session["results"][since:]
+    return JOB_STORE.load_results(session_id, since)
+
+# "street, city, ST 12345[, USA]" covers nearly every Maps address; usaddress (a CRF model) only sees the rest
+ADDRESS_REGEX = re.compile(r",\s*(?P<city>[^,\d][^,]*?),\s*(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}(?:-\d{4})?)(?:,\s*(?:USA|United States))?\s*$")
+ADDRESS_MEMO_SIZE = 4096
+
+@lru_cache(maxsize=ADDRESS_MEMO_SIZE)
+def parse_address(address):
+    # Returns (city, state, zip); irregular addresses are also memoized in the result cache across runs
+    if not address: return "", "", ""
+    if m := ADDRESS_REGEX.search(address): return m.group("city").strip(), m.group("state"), m.group("zip")
+    if hit := RESULT_CACHE.get("address", address): return tuple(hit)
+    try:
+        tagged, _ = usaddress.tag(address)
+        parsed = (tagged.get('PlaceName', ''), tagged.get('StateName', ''), tagged.get('ZipCode', ''))
+    except:
+        parts = address.split(', ')
+        parsed = (parts[-3], parts[-2].split(' ')[0] if len(parts[-2].split(' ')) > 1 else '', '') if len(parts) >= 3 else ("", "", "")
+    RESULT_CACHE.set("address", address, parsed)
+    return parsed
+
+def normalize_addresses(frame, column="Address"):
+    # Batch pass over a results column: one vectorized regex extract, then parse_address per distinct irregular address
+    if frame.empty or column not in frame: return frame
+    addresses = frame[column].fillna("").astype(str)
+    parsed = addresses.str.extract(ADDRESS_REGEX)
+    irregular = parsed["city"].isna() & (addresses != "")
+    if irregular.any():
+        fallback = {a: parse_address(a) for a in addresses[irregular].unique()}
+        parsed.loc[irregular, ["city", "state", "zip"]] = [fallback[a] for a in addresses[irregular]]
+    parsed = parsed.fillna("")
+    has_address = addresses != ""
+    for target, source in (("City", "city"), ("State", "state"), ("Postal Code", "zip")):
+        frame[target] = parsed[source].str.strip().where(has_address, frame[target] if target in frame else "")
+    return frame
+
+METRIC_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+METRIC_SAMPLES = 1000
+JOB_TIMING_SAMPLES = 200
+
+def selenium_exceptions():
+    # None until something has imported Selenium, and nothing can raise its exceptions before that
+    return sys.modules.get("selenium.common.exceptions")
+
+def is_timeout(exc):
+    if isinstance(exc, (requests.Timeout, TimeoutError)): return True
+    return bool(exceptions := selenium_exceptions()) and isinstance(exc, exceptions.TimeoutException)
+
+def new_timing(): return {"count": 0, "seconds": 0.0, "errors": 0, "timeouts": 0, "samples": []}
+
+def percentile(samples, q):
+    if not samples: return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+def timing_summary(timings):
+    return {stage: {"count": t["count"], "seconds": round(t["seconds"], 2), "mean": round(t["seconds"] / t["count"], 3) if t["count"] else None,
+                    "p50": percentile(t["samples"], 0.5), "p95": percentile(t["samples"], 0.95), "errors": t["errors"], "timeouts": t["timeouts"]}
+            for stage, t in timings.items()}
+
+class Metrics:
+    # Process-wide stage spans: histogram buckets for Prometheus, recent samples for p50/p95, error and timeout counters.
+    # The same observation is added to the bound job's own timings for its summary
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, stage):
+        # METRICS.fail(e) inside the block marks the span failed when the caller swallows the exception itself
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(None)
+        start = time.monotonic()
+        try: yield
+        except BaseException as e:
+            stack[-1] = e
+            raise
+        finally: self.observe(stage, time.monotonic() - start, stack.pop())
+
+    def fail(self, exc):
+        stack = getattr(self.local, "stack", None)
+        if stack: stack[-1] = exc
+
+    def observe(self, stage, seconds, exc=None):
+        timeout = is_timeout(exc)
+        with self.lock:
+            t = self.stages.setdefault(stage, dict(new_timing(), buckets=[0] * len(METRIC_BUCKETS)))
+            self._add(t, seconds, exc, timeout, METRIC_SAMPLES)
+            for i, bound in enumerate(METRIC_BUCKETS):
+                if seconds <= bound: t["buckets"][i] += 1
+        session_id = current_session_id()
+        if session_id is None: return
+        session = get_session(session_id)
+        with session["lock"]: self._add(session["stage_timings"].setdefault(stage, new_timing()), seconds, exc, timeout, JOB_TIMING_SAMPLES)
+
+    def _add(self, t, seconds, exc, timeout, max_samples):
+        t["count"] += 1
+        t["seconds"] += seconds
+        if exc is not None: t["timeouts" if timeout else "errors"] += 1
+        t["samples"].append(seconds)
+        if len(t["samples"]) > max_samples: del t["samples"][:len(t["samples"]) - max_samples]
+
+    def summary(self):
+        with self.lock: return timing_summary({k: dict(v, samples=list(v["samples"])) for k, v in self.stages.items()})
+
+    def prometheus(self):
+        lines = ["# TYPE scraper_stage_seconds histogram"]
+        with self.lock: stages = {k: dict(v, buckets=list(v["buckets"])) for k, v in self.stages.items()}
+        for stage, t in stages.items():
+            for bound, n in zip(METRIC_BUCKETS, t["buckets"]): lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines += [f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {t["count"]}', f'scraper_stage_seconds_sum{{stage="{stage}"}} {t["seconds"]:.3f}', f'scraper_stage_seconds_count{{stage="{stage}"}} {t["count"]}']
+        lines.append("# TYPE scraper_stage_seconds_quantile gauge")
+        for stage, t in stages.items():
+            for q in (0.5, 0.95):
+                if (p := percentile(t["samples"], q)) is not None: lines.append(f'scraper_stage_seconds_quantile{{stage="{stage}",quantile="{q}"}} {p}')
+        lines.append("# TYPE scraper_stage_failures_total counter")
+        for stage, t in stages.items():
+            lines += [f'scraper_stage_failures_total{{stage="{stage}",kind="error"}} {t["errors"]}', f'scraper_stage_failures_total{{stage="{stage}",kind="timeout"}} {t["timeouts"]}']
+        return lines
+
+METRICS = Metrics()
+
+def chrome_processes():
+    # (process count, total RSS bytes) of Chrome/chromedriver processes, read from /proc; None where /proc is unavailable
+    count, rss = 0, 0
+    try: pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError: return None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                status = f.read()
+        except OSError: continue
+        name = status.split("\n", 1)[0].partition(":")[2].strip()
+        if not name.startswith(("chrome", "chromium")): continue
+        count += 1
+        if m := re.search(r"^VmRSS:\s+(\d+) kB", status, re.MULTILINE): rss += int(m.group(1)) * 1024
+    return count, rss
+
+CHROME_PATHS = ["/usr/bin/google-chrome-stable", "/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", 10))
+DRIVER_MAX_PAGES = int(os.environ.get("DRIVER_MAX_PAGES", 50))
+DRIVER_PAGE_LOAD_TIMEOUT = 30
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def resolve_driver_path():
+    # ChromeDriverManager().install() hits the network and the disk, so resolve the binary once per process
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            from webdriver_manager.core.os_manager import ChromeType
+            try:
+                _driver_path = ChromeDriverManager().install()
+            except:
+                try:
+                    _driver_path = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
+                except:
+                    _driver_path = "/usr/bin/chromedriver"
+        return _driver_path
+
+# Request governor: every page load and HTTP fetch passes one process-wide gate per host, a token bucket
+# plus a concurrency cap, with jittered exponential retries and a circuit breaker for hosts that keep failing
+GOVERNOR_RATE = float(os.environ.get("GOVERNOR_RATE", 2.0))
+GOVERNOR_BURST = int(os.environ.get("GOVERNOR_BURST", 4))
+HTTP_PER_HOST_LIMIT = 4
+# Host suffix -> (requests per second, burst, concurrent requests)
+GOVERNOR_HOST_LIMITS = {"google.com": (8.0, 16, DRIVER_POOL_SIZE), "facebook.com": (3.0, 6, 6)}
+GOVERNOR_RETRIES = 2
+GOVERNOR_BACKOFF = 0.5
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60
+TRANSIENT_STATUS = frozenset([429, 500, 502, 503, 504])
+TRANSIENT_ERRORS = (requests.Timeout, requests.ConnectionError, TimeoutError, ConnectionError)
+
+def transient_errors():
+    exceptions = selenium_exceptions()
+    return TRANSIENT_ERRORS + (exceptions.WebDriverException,) if exceptions else TRANSIENT_ERRORS
+
+class CircuitOpenError(Exception): pass
+
+def new_governor_stats(): return {"wasted_timeout_seconds": 0.0, "timeouts": 0, "retries": 0, "breaker_skips": 0}
+
+def _record_governor(key, amount=1):
+    session_id = current_session_id()
+    if session_id is None: return
+    session = get_session(session_id)
+    with session["lock"]: session["governor"][key] += amount
+
+class HostGate:
+    def __init__(self, rate, burst, concurrency):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.failures, self.open_until = 0, 0.0
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def is_open(self):
+        with self.lock: return time.monotonic() < self.open_until
+
+    def record(self, ok):
+        # After the cooldown the failure count is still at the threshold, so a single failed probe reopens the circuit
+        with self.lock:
+            if ok: self.failures, self.open_until = 0, 0.0
+            else:
+                self.failures += 1
+                if self.failures >= BREAKER_THRESHOLD: self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+class RequestGovernor:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gates = {}
+        self.counters = {"requests": 0, "retries": 0, "timeouts": 0, "breaker_skips": 0, "wasted_timeout_seconds": 0.0}
+
+    def gate(self, url):
+        # Keyed by host and port; limits are looked up by host suffix
+        parts = urllib.parse.urlsplit(url)
+        host, key = parts.hostname or "", parts.netloc.lower().removeprefix("www.")
+        with self.lock:
+            if key not in self.gates:
+                limits = next((v for suffix, v in GOVERNOR_HOST_LIMITS.items() if host == suffix or host.endswith("." + suffix)), (GOVERNOR_RATE, GOVERNOR_BURST, HTTP_PER_HOST_LIMIT))
+                self.gates[key] = HostGate(*limits)
+            return self.gates[key]
+
+    def count(self, key, amount=1):
+        with self.lock: self.counters[key] += amount
+        _record_governor(key, amount)
+
+    def call(self, url, fn, retries=0, breaker=True):
+        # fn() does the request; transient errors and 429/5xx responses are retried, an open circuit fails fast
+        gate = self.gate(url)
+        for attempt in range(retries + 1):
+            if breaker and gate.is_open():
+                self.count("breaker_skips")
+                raise CircuitOpenError(domain_cache_key(url))
+            gate.take()
+            start = time.monotonic()
+            with self.lock: self.counters["requests"] += 1
+            try:
+                with gate.slots: result = fn()
+            except transient_errors() as e:
+                if is_timeout(e):
+                    self.count("timeouts")
+                    self.count("wasted_timeout_seconds", time.monotonic() - start)
+                if breaker: gate.record(False)
+                if attempt == retries: raise
+            else:
+                failed = getattr(result, "status_code", None) in TRANSIENT_STATUS
+                if breaker: gate.record(not failed)
+                if not failed or attempt == retries: return result
+            self.count("retries")
+            time.sleep(GOVERNOR_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def stats(self):
+        with self.lock: return dict(self.counters, hosts=len(self.gates), open_circuits=sum(g.open_until > time.monotonic() for g in self.gates.values()))
+
+GOVERNOR = RequestGovernor()
+
+class ProxyRotator:
+    # Round-robin over a proxy list; prefer(proxy) lets the caller favour a proxy it already has a warm browser for
+    def __init__(self, proxies):
+        self.proxies = list(proxies)
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def pick(self, prefer=None):
+        with self.lock:
+            order = self.proxies[self.position:] + self.proxies[:self.position]
+            proxy = next((p for p in order if prefer and prefer(p)), order[0])
+            self.position = (self.proxies.index(proxy) + 1) % len(self.proxies)
+            return proxy
+
+_rotators = {}
+_rotators_lock = threading.Lock()
+
+def proxy_rotation(config):
+    # config["proxies"] (a list or comma-separated string) or the single config["proxy"]; one shared rotator per list
+    proxies = config.get("proxies") or config.get("proxy") or []
+    if isinstance(proxies, str): proxies = proxies.split(",")
+    proxies = tuple(p.strip() for p in proxies if p and p.strip())
+    if len(proxies) < 2: return proxies[0] if proxies else None
+    with _rotators_lock: return _rotators.setdefault(proxies, ProxyRotator(proxies))
+
+def pick_proxy(proxy, prefer=None):
+    return proxy.pick(prefer) if isinstance(proxy, ProxyRotator) else proxy
+
+# Outgoing URL prefix rewrites, "from=to" pairs separated by commas; the offline benchmark points Maps,
+# websites and Facebook at local fixtures this way
+URL_REWRITES = [tuple(pair.split("=", 1)) for pair in os.environ.get("URL_REWRITES", "").split(",") if "=" in pair]
+
+def rewrite_url(url):
+    for prefix, target in URL_REWRITES:
+        if url.startswith(prefix): return target + url[len(prefix):]
+    return url
+
+@lru_cache(maxsize=None)
+def chrome_class():
+    # Defined on first use so Selenium is only imported by runs that start a browser
+    from selenium import webdriver
+
+    class CountingChrome(webdriver.Chrome):
+        pages_loaded = 0
+        def get(self, url):
+            self.pages_loaded += 1
+            # Rate-limited but outside the breaker: an open circuit on Maps would turn every queued place into a final error row
+            return GOVERNOR.call(url, lambda: super(CountingChrome, self).get(rewrite_url(url)), breaker=False)
+
+        def load_blank(self):
+            # Bypasses the counter and the governor
+            super().get("about:blank")
+
+    return CountingChrome
 
 def build_chrome(headless_mode=False, proxy=None):
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
     opts = Options()
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
@@ -74,176 +778,764 @@ def build_chrome(headless_mode=False, proxy=None):
     if headless_mode: opts.add_argument("--headless=new")
     if proxy: opts.add_argument(f"--proxy-server={proxy}")
     
-    chrome_paths = [
-        "/usr/bin/google-chrome-stable",
-        "/usr/bin/google-chrome",
-        "/usr/bin/chromium",
-        "/usr/bin/chromium-browser"
-    ]
-    
-    for path in chrome_paths:
+    for path in CHROME_PATHS:
         if os.path.exists(path):
             opts.binary_location = path
             break
     
-    try:
-        driver_path = ChromeDriverManager().install()
-    except:
+    with METRICS.span("build_chrome"): return chrome_class()(service=Service(resolve_driver_path()), options=opts)
+
+class DriverPool:
+    def __init__(self, max_size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES):
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.cond = threading.Condition()
+        self.idle = {}
+        self.live = 0
+        self.counters = {"hits": 0, "spawns": 0, "recycles": 0, "crashes": 0, "lease_seconds": 0.0}
+
+    def acquire(self, headless_mode=True, proxy=None):
+        evicted = None
+        with self.cond:
+            proxy = pick_proxy(proxy, lambda p: self.idle.get((bool(headless_mode), p)))
+            key = (bool(headless_mode), proxy or "")
+            while True:
+                if self.idle.get(key):
+                    self.counters["hits"] += 1
+                    return self.idle[key].pop()
+                if self.live < self.max_size:
+                    self.live += 1
+                    break
+                # Pool is full: give a warm browser of another key its slot, or wait for a release
+                other = next((k for k, v in self.idle.items() if v), None)
+                if other is not None:
+                    evicted = self.idle[other].pop()
+                    self.counters["recycles"] += 1
+                    break
+                self.cond.wait()
+            self.counters["spawns"] += 1
+        if evicted: self._quit(evicted)
         try:
-            driver_path = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
+            driver = build_chrome(headless_mode, proxy)
         except:
-            driver_path = "/usr/bin/chromedriver"
-    
-    return webdriver.Chrome(service=Service(driver_path), options=opts)
+            with self.cond:
+                self.live -= 1
+                self.cond.notify()
+            raise
+        driver.pool_key = key
+        return driver
 
-def find_emails(html):
-    if not html: return []
-    html = html.lower().replace('[at]','@').replace('(at)','@').replace('[dot]','.').replace('(dot)','.').replace(' at ','@').replace(' dot ','.')
-    emails = EMAIL_REGEX.findall(html)
-    
-    invalid_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.pdf', '.css', '.js', '.ico']
-    invalid_domains = ['sentry.io', 'example.com', 'test.com', 'localhost', 'w3.org', 'schema.org', 'google.com', 'facebook.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com', 'youtube.com', 'maps.google.com']
-    invalid_keywords = ['noreply', 'no-reply', 'donotreply', 'mailer-daemon', 'postmaster', 'webmaster', 'abuse', 'spam', 'privacy', 'support@example', 'info@example', 'contact@example']
-    
-    valid_emails = []
-    for e in emails:
-        e = e.strip().lower()
-        if e.count('@') != 1: continue
-        if any(ext in e for ext in invalid_extensions): continue
-        
-        local, domain = e.split('@')
-        if len(local) < 2 or len(domain) < 4: continue
-        if any(kw in local for kw in invalid_keywords): continue
-        if any(d in domain for d in invalid_domains): continue
-        if not '.' in domain: continue
-        
-        valid_emails.append(e)
-    
-    return sorted(set(valid_emails))
-def find_phone_numbers(html): return list(set([m.strip() for m in PHONE_REGEX.findall(re.sub(r'<[^>]+>', ' ', html)) if len(re.sub(r'[^\d]','',m))>=10]))
+    def release(self, driver):
+        worn_out = driver.pages_loaded >= self.max_pages
+        healthy = not worn_out and self._reset(driver)
+        with self.cond:
+            if healthy:
+                self.idle.setdefault(driver.pool_key, []).append(driver)
+            else:
+                self.live -= 1
+                self.counters["recycles" if worn_out else "crashes"] += 1
+            self.cond.notify()
+        if not healthy: self._quit(driver)
 
-def collect_gmaps_links(session_id, config):
-    session = get_session(session_id)
-    driver = build_chrome(config.get("headless_mode", True), config.get("proxy"))
-    queries = [f"{config.get('general_search_term','')} {cat} {zipc}".strip() for cat in config.get('categories',[]) for zipc in config.get('zipcodes',[])]
-    for i, query in enumerate(queries):
-        if session["stop_scraping_flag"]: break
-        driver.get(f"https://www.google.com/maps/search/{urllib.parse.quote(query)}")
+    @contextmanager
+    def lease(self, headless_mode=True, proxy=None):
+        # Every browser in use holds a scheduler slot, so the process-wide budget covers all sessions
+        with SCHEDULER.slot(current_session_id()):
+            driver = self.acquire(headless_mode, proxy)
+            start = time.monotonic()
+            try: yield driver
+            finally:
+                with self.cond: self.counters["lease_seconds"] += time.monotonic() - start
+                self.release(driver)
+
+    def _reset(self, driver):
+        # Doubles as the health check: a crashed browser fails here and gets replaced
         try:
-            feed = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//div[@role="feed"]')))
-            for _ in range(config.get("max_scrolls", 10)):
-                driver.execute_script("arguments[0].scrollBy(0, 3000);", feed)
-                time.sleep(0.3)
-                cards = driver.find_elements(By.CSS_SELECTOR, 'a.hfpxzc')
-                for c in cards[-30:]:
-                    href = c.get_attribute("href")
-                    if href and "/maps/place/" in href:
-                        with session["lock"]:
-                            if (href, query, "") not in session["collected_links"]:
-                                session["collected_links"].append((href, query, ""))
-                with session["lock"]: link_count = len(session["collected_links"])
-                update_status(session_id, f"Query {i+1}/{len(queries)}: Found {link_count} links", link_count=link_count, link_progress=(i+1)/len(queries))
+            handles = driver.window_handles
+            for h in handles[1:]:
+                driver.switch_to.window(h)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.set_page_load_timeout(DRIVER_PAGE_LOAD_TIMEOUT)
+            driver.load_blank()
+            return True
+        except: return False
+
+    def _quit(self, driver):
+        try: driver.quit()
         except: pass
-    driver.quit()
 
-def extract_social_links(html):
+    def stats(self):
+        with self.cond:
+            return dict(self.counters, live=self.live, idle=sum(len(v) for v in self.idle.values()), max_size=self.max_size)
+
+    def shutdown(self):
+        with self.cond:
+            drivers = [d for v in self.idle.values() for d in v]
+            self.idle.clear()
+            self.live -= len(drivers)
+        for d in drivers: self._quit(d)
+
+DRIVER_POOL = DriverPool()
+atexit.register(DRIVER_POOL.shutdown)
+
+BROWSER_SLOTS = int(os.environ.get("BROWSER_SLOTS", DRIVER_POOL_SIZE))
+BROWSER_MEMORY_MB = int(os.environ.get("BROWSER_MEMORY_MB", 350))
+MEMORY_AWARE_ADMISSION = os.environ.get("MEMORY_AWARE_ADMISSION", "0") == "1"
+
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"): return int(line.split()[1]) // 1024
+    except OSError: pass
+    return None
+
+class Scheduler:
+    # Process-wide admission: at most max_jobs jobs run at once (the rest queue by priority),
+    # and browser slots are handed out fairly, to the waiting session holding the fewest per unit of priority
+    def __init__(self, max_jobs=MAX_CONCURRENT_SESSIONS, slots=BROWSER_SLOTS, memory_aware=MEMORY_AWARE_ADMISSION):
+        self.max_jobs = max_jobs
+        self.slots = slots
+        self.memory_aware = memory_aware
+        self.cond = threading.Condition()
+        self.seq = itertools.count()
+        self.running = set()
+        self.job_queue = []
+        self.priorities = {}
+        self.held = {}
+        self.waiters = []
+        self.in_use = 0
+        self.counters = {"jobs_started": 0, "jobs_queued": 0, "slot_waits": 0, "memory_deferrals": 0}
+
+    def submit(self, session_id, priority, target, *args):
+        # Returns 0 when the job started right away, otherwise its 1-based queue position
+        with self.cond:
+            self.priorities[session_id] = priority
+            if len(self.running) < self.max_jobs and not self.job_queue:
+                self._start(session_id, target, args)
+                return 0
+            heapq.heappush(self.job_queue, (-priority, next(self.seq), session_id, target, args))
+            self.counters["jobs_queued"] += 1
+            return self._position(session_id)
+
+    def cancel(self, session_id):
+        with self.cond:
+            queued = [j for j in self.job_queue if j[2] != session_id]
+            if len(queued) == len(self.job_queue): return False
+            self.job_queue = queued
+            heapq.heapify(self.job_queue)
+            return True
+
+    def is_running(self, session_id):
+        # True until the job's thread returns, which outlasts a stop request while in-flight scrapes finish
+        with self.cond: return session_id in self.running
+
+    def queue_position(self, session_id):
+        with self.cond: return self._position(session_id)
+
+    def _position(self, session_id):
+        return next((i for i, j in enumerate(sorted(self.job_queue), 1) if j[2] == session_id), 0)
+
+    def _start(self, session_id, target, args):
+        self.running.add(session_id)
+        self.counters["jobs_started"] += 1
+        threading.Thread(target=self._run, args=(session_id, target, args), daemon=True).start()
+
+    def _run(self, session_id, target, args):
+        try: target(*args)
+        finally:
+            with self.cond:
+                self.running.discard(session_id)
+                while self.job_queue and len(self.running) < self.max_jobs:
+                    _, _, next_id, next_target, next_args = heapq.heappop(self.job_queue)
+                    self._start(next_id, next_target, next_args)
+
+    @contextmanager
+    def slot(self, session_id=None):
+        self.acquire_slot(session_id)
+        try: yield
+        finally: self.release_slot(session_id)
+
+    def acquire_slot(self, session_id=None):
+        with self.cond:
+            ticket = (session_id, next(self.seq))
+            self.waiters.append(ticket)
+            waited = False
+            while not (self.in_use < self.slots and self._next_waiter() == ticket and self._memory_ok()):
+                waited = True
+                self.cond.wait(1.0 if self.memory_aware else None)
+            self.waiters.remove(ticket)
+            self.in_use += 1
+            self.held[session_id] = self.held.get(session_id, 0) + 1
+            if waited: self.counters["slot_waits"] += 1
+            self.cond.notify_all()
+
+    def release_slot(self, session_id=None):
+        with self.cond:
+            self.in_use -= 1
+            self.held[session_id] -= 1
+            if not self.held[session_id]: del self.held[session_id]
+            self.cond.notify_all()
+
+    def _next_waiter(self):
+        weight = lambda sid: 1 + max(0, self.priorities.get(sid, 0))
+        return min(self.waiters, key=lambda t: (self.held.get(t[0], 0) / weight(t[0]), t[1]))
+
+    def _memory_ok(self):
+        # Always admit the first browser so a low-memory box still makes progress
+        if not self.memory_aware or self.in_use == 0: return True
+        mb = available_memory_mb()
+        if mb is None or mb >= BROWSER_MEMORY_MB: return True
+        self.counters["memory_deferrals"] += 1
+        return False
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counters, running_jobs=len(self.running), queued_jobs=len(self.job_queue), slots=self.slots, slots_in_use=self.in_use, slot_waiters=len(self.waiters))
+
+SCHEDULER = Scheduler()
+
+WAIT_POLL_INTERVAL = 0.1
+PAGE_READY_TIMEOUT = 5
+SCROLL_SETTLE_TIMEOUT = 1.5
+CLICK_SETTLE_TIMEOUT = 0.5
+MAPS_SCROLL_TIMEOUT = 2.0
+MAPS_END_OF_LIST = "span.HlvSq"
+SCROLL_JS = """const el = arguments[0] || document.scrollingElement || document.documentElement;
+if (arguments[1]) el.scrollBy(0, arguments[1]);
+return [el.scrollHeight, el.scrollTop + el.clientHeight >= el.scrollHeight - 2, !!(arguments[2] && document.querySelector(arguments[2]))];"""
+DOM_SIZE_JS = "return document.getElementsByTagName('*').length;"
+_job_local = threading.local()
+
+def bind_session(session_id): _job_local.session_id = session_id
+
+def current_session_id(): return getattr(_job_local, "session_id", None)
+
+def _record_wait(seconds):
+    session_id = current_session_id()
+    if session_id is None: return
+    session = get_session(session_id)
+    with session["lock"]: session["wait_seconds"] += seconds
+
+def wait_until(condition, timeout, poll=WAIT_POLL_INTERVAL):
+    # Polls instead of sleeping: returns the first truthy result, or the last falsy one once timeout is spent
+    from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+    start = time.monotonic()
+    result = None
+    try:
+        while True:
+            try: result = condition()
+            except (NoSuchElementException, StaleElementReferenceException): result = None
+            if result or time.monotonic() - start >= timeout: return result
+            time.sleep(poll)
+    finally: _record_wait(time.monotonic() - start)
+
+def wait_for_element(driver, by, selector, timeout):
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    start = time.monotonic()
+    try: return WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(EC.presence_of_element_located((by, selector)))
+    finally: _record_wait(time.monotonic() - start)
+
+def wait_for_page_ready(driver, timeout=PAGE_READY_TIMEOUT):
+    return wait_until(lambda: driver.execute_script("return document.readyState;") != "loading", timeout)
+
+def wait_for_dom_change(driver, before, timeout=CLICK_SETTLE_TIMEOUT):
+    return wait_until(lambda: driver.execute_script(DOM_SIZE_JS) != before, timeout)
+
+def scroll_until_stable(driver, element=None, step=1000, max_scrolls=10, settle_timeout=SCROLL_SETTLE_TIMEOUT, end_selector=None, on_scroll=None):
+    # max_scrolls and settle_timeout are upper bounds; stop once content stops growing or the end marker shows up
+    scrolls = 0
+    while scrolls < max_scrolls:
+        height, at_bottom, at_end = driver.execute_script(SCROLL_JS, element, step, end_selector)
+        scrolls += 1
+        grew = not at_end
+        if grew and at_bottom:
+            # Only wait when lazy content could still be loading below the fold
+            state = wait_until(lambda: (lambda h, _, end: (h, end) if h > height or end else None)(*driver.execute_script(SCROLL_JS, element, 0, end_selector)), settle_timeout)
+            grew = bool(state) and not state[1]
+        if on_scroll: on_scroll()
+        if not grew: break
+    return scrolls
+
+# Precompiled once. Emails are found by expanding around each "@" (or "[at]", "(at)", " at ") located with
+# str.find, instead of rewriting the page and regex-scanning every position; socials key off the literal "http"
+EMAIL_AT_TOKENS = ('@', '[at]', '(at)', ' at ')
+EMAIL_LOCAL_REGEX = re.compile(r" ?[a-z0-9._%+\-]{1,64}")  # matched against the reversed text before the token
+EMAIL_LOCAL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789._%+-")
+EMAIL_DOMAIN_REGEX = re.compile(r" ?((?:[a-z0-9\-]+(?:\.| ?\[dot\] ?| ?\(dot\) ?| dot ))+[a-z]{2,})")
+EMAIL_DOT_REGEX = re.compile(r" ?\[dot\] ?| ?\(dot\) ?| dot ")
+SOCIAL_REGEX = re.compile(r"https?://(?i:(?:www\.)?(?P<facebook>facebook)\.com|(?:www\.)?(?P<instagram>instagram)\.com|(?:www\.)?(?P<twitter>twitter|x)\.com|(?:[a-z]{2,3}\.)?(?P<linkedin>linkedin)\.com)/[^\s\"'<>]+")
+TAG_REGEX = re.compile(r"<[^>]+>")
+SOCIAL_GROUPS = {"facebook": "Facebook", "instagram": "Instagram", "twitter": "Twitter", "linkedin": "LinkedIn"}
+EMAIL_BLOCKED_EXTENSIONS = frozenset(['png', 'jpg', 'jpeg', 'gif', 'svg', 'webp', 'pdf', 'css', 'js', 'ico'])
+EMAIL_BLOCKED_DOMAINS = frozenset(['sentry.io', 'example.com', 'test.com', 'localhost', 'w3.org', 'schema.org', 'google.com', 'facebook.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com', 'youtube.com'])
+EMAIL_BLOCKED_LOCAL = re.compile("|".join(map(re.escape, ['noreply', 'no-reply', 'donotreply', 'mailer-daemon', 'postmaster', 'webmaster', 'abuse', 'spam', 'privacy'])))
+
+def valid_email(e):
+    local, _, domain = e.partition('@')
+    if len(local) < 2 or len(domain) < 4 or '.' not in domain: return False
+    labels = domain.split('.')
+    # Asset names like logo@2x.png look like emails
+    if labels[-1] in EMAIL_BLOCKED_EXTENSIONS: return False
+    # Suffix lookup: blocks the domain and every subdomain of it
+    if any('.'.join(labels[i:]) in EMAIL_BLOCKED_DOMAINS for i in range(len(labels) - 1)): return False
+    return not EMAIL_BLOCKED_LOCAL.search(local)
+
+def valid_phone(m): return sum(c.isdigit() for c in m) >= 10
+
+def scan_emails(html):
+    low = html.lower()
+    tokens = []
+    for token in EMAIL_AT_TOKENS:
+        i = low.find(token)
+        while i != -1:
+            tokens.append((i, i + len(token)))
+            i = low.find(token, i + 1)
+    emails, end = set(), 0
+    for start, after in sorted(tokens):
+        if start < end: continue
+        local = EMAIL_LOCAL_REGEX.match(low[max(end, start - 65):start][::-1])
+        # A local part that runs on past 64 characters is not an address; taking its last 64 would invent one
+        before = start - len(local.group()) - 1 if local else -1
+        if before >= end and low[before] in EMAIL_LOCAL_CHARS: continue
+        domain = local and EMAIL_DOMAIN_REGEX.match(low, after)
+        if not domain: continue
+        end = domain.end()
+        e = f"{local.group()[::-1].strip()}@{EMAIL_DOT_REGEX.sub('.', domain.group(1))}"
+        if valid_email(e): emails.add(e)
+    return emails
+
+def extract_contacts(html, phones=True):
+    # Returns (emails, phones, socials) from one page
     socials = {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
-    patterns = {"Facebook": r'https?://(?:www\.)?facebook\.com/[^\s"\'\'<>]+', "Instagram": r'https?://(?:www\.)?instagram\.com/[^\s"\'\'<>]+', "Twitter": r'https?://(?:www\.)?(?:twitter|x)\.com/[^\s"\'\'<>]+', "LinkedIn": r'https?://(?:[a-z]{2,3}\.)?linkedin\.com/[^\s"\'\'<>]+'}
-    for k, p in patterns.items():
-        m = re.findall(p, html, re.IGNORECASE)
-        if m: socials[k] = m[0].split('?')[0].rstrip('/')
-    return socials
-
-def scrape_website_selenium(url, headless_mode, proxy=None):
-    driver = None
+    if not html: return [], [], socials
+    for m in SOCIAL_REGEX.finditer(html):
+        kind = SOCIAL_GROUPS[m.lastgroup]
+        if not socials[kind]: socials[kind] = m.group().split('?')[0].rstrip('/')
+    found_phones = {p.strip() for p in PHONE_REGEX.findall(TAG_REGEX.sub(' ', html)) if valid_phone(p)} if phones else set()
+    return sorted(scan_emails(html)), list(found_phones), socials
+
+class ContactScanner:
+    # Accumulates contacts over repeated page_source snapshots; a snapshot already seen is not rescanned
+    def __init__(self, phones=True):
+        self.phones_enabled = phones
+        self.emails, self.phones, self.seen = set(), set(), set()
+        self.socials = {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
+
+    def scan(self, html):
+        if not html or (key := (len(html), hash(html))) in self.seen: return False
+        self.seen.add(key)
+        emails, phones, socials = extract_contacts(html, self.phones_enabled)
+        self.emails.update(emails)
+        self.phones.update(phones)
+        for k, v in socials.items():
+            if v and not self.socials[k]: self.socials[k] = v
+        return True
+
+def find_emails(html): return extract_contacts(html, phones=False)[0]
+def find_phone_numbers(html): return extract_contacts(html)[1]
+def extract_social_links(html): return extract_contacts(html, phones=False)[2]
+
+CARD_HREFS_JS = "return Array.from(document.querySelectorAll('a.hfpxzc'), a => a.href);"
+
+def record_links(session_id, hrefs, query, zipcode):
+    # Dedupes by place key in O(1) and remembers every query that matched the place.
+    # Returns (total link count, links new to this job, place keys seen in this batch)
+    session = get_session(session_id)
+    keyed = [(place_key(h), h) for h in hrefs if h and "/maps/place/" in h]
+    new_links, new_matches = [], []
+    with session["lock"]:
+        index, matches = session["link_index"], session["link_matches"]
+        for key, href in keyed:
+            if key not in index:
+                index[key] = len(session["collected_links"])
+                session["collected_links"].append((href, query, zipcode))
+                new_links.append((href, query, zipcode))
+            if (query, zipcode) not in matches.setdefault(key, set()):
+                matches[key].add((query, zipcode))
+                new_matches.append((key, query, zipcode))
+        link_count = len(session["collected_links"])
+    JOB_STORE.add_links(session_id, new_links)
+    JOB_STORE.add_link_matches(session_id, new_matches)
+    return link_count, new_links, {key for key, _ in keyed}
+
+def matched_queries(session_id, gmaps_url):
+    session = get_session(session_id)
+    with session["lock"]: return "; ".join(sorted(q for q, _ in session["link_matches"].get(place_key(gmaps_url), ())))
+
+COLLECTOR_BROWSERS = 2
+
+def collect_query(session_id, driver, query, zipc, config, on_links=None, record=None):
+    # Runs one Maps search to exhaustion; returns its link yield and timing.
+    # record(hrefs, query, zipc) -> (new links, place keys) replaces the job bookkeeping in a standalone worker
+    start = time.monotonic()
+    seen, new_count, status, error = set(), 0, "ok", None
     try:
-        driver = build_chrome(headless_mode, proxy)
-        driver.set_page_load_timeout(10)
-        driver.get(url)
-        time.sleep(1)
-        
-        emails = set()
-        
-        # Scroll entire page
-        for _ in range(5):
-            driver.execute_script("window.scrollBy(0, 1000);")
-            time.sleep(0.4)
-            emails.update(find_emails(driver.page_source))
-        
-        socials = extract_social_links(driver.page_source)
-        
-        # Check ALL internal links for emails
-        try:
-            all_links = driver.find_elements(By.TAG_NAME, 'a')
-            contact_keywords = ['contact', 'about', 'team', 'reach', 'connect', 'email', 'support', 'info']
-            
-            for link in all_links[:30]:
-                try:
-                    href = link.get_attribute('href')
-                    text = link.text.lower()
-                    
-                    if href and url in href and any(kw in href.lower() or kw in text for kw in contact_keywords):
-                        driver.get(href)
-                        time.sleep(0.8)
-                        
-                        # Scroll this page too
-                        for _ in range(3):
-                            driver.execute_script("window.scrollBy(0, 1000);")
-                            time.sleep(0.3)
-                        
-                        emails.update(find_emails(driver.page_source))
-                        
-                        if len(emails) >= 3:
-                            break
-                            
-                        driver.back()
-                        time.sleep(0.5)
-                except: continue
-        except: pass
-        
-        return list(emails), socials
-    except:
+        driver.get(f"https://www.google.com/maps/search/{urllib.parse.quote(query)}")
+        feed = wait_for_element(driver, By.XPATH, '//div[@role="feed"]', 10)
+        def collect_cards():
+            nonlocal new_count
+            # One round-trip for every card href instead of one get_attribute per card
+            hrefs = driver.execute_script(CARD_HREFS_JS)
+            if record: new_links, keys = record(hrefs, query, zipc)
+            else:
+                link_count, new_links, keys = record_links(session_id, hrefs, query, zipc)
+                update_status(session_id, f"Query \"{query}\": Found {link_count} links", link_count=link_count)
+            seen.update(keys)
+            new_count += len(new_links)
+            if on_links and new_links: on_links(new_links)
+        scroll_until_stable(driver, feed, 3000, config.get("max_scrolls", 10), config.get("scroll_timeout", MAPS_SCROLL_TIMEOUT), MAPS_END_OF_LIST, collect_cards)
+    except Exception as e:
+        error, status = e, f"error: {type(e).__name__}"
+    METRICS.observe("maps_query", time.monotonic() - start, error)
+    return {"query": query, "zipcode": zipc, "links": len(seen), "new_links": new_count, "seconds": round(time.monotonic() - start, 2), "status": status}
+
+def job_queries(config):
+    return [(f"{config.get('general_search_term','')} {cat} {zipc}".strip(), zipc) for cat in config.get('categories',[]) for zipc in config.get('zipcodes',[])]
+
+def collect_gmaps_links(session_id, config, on_links=None):
+    # Queries are sharded across `collectors` browsers; on_links receives each batch of new links as it is found
+    session = get_session(session_id)
+    queries = job_queries(config)
+    done_queries = JOB_STORE.done_queries(session_id)
+    todo = queue.Queue()
+    for q in queries:
+        if q[0] not in done_queries: todo.put(q)
+    finished = [len(queries) - todo.qsize()]
+    lock = threading.Lock()
+    def collector():
+        with DRIVER_POOL.lease(config.get("headless_mode", True), proxy_rotation(config)) as driver:
+            while not session["stop_scraping_flag"]:
+                try: query, zipc = todo.get_nowait()
+                except queue.Empty: return
+                stats = collect_query(session_id, driver, query, zipc, config, on_links)
+                if stats["status"] == "ok": JOB_STORE.mark_query_done(session_id, query, stats)
+                with lock:
+                    finished[0] += 1
+                    done = finished[0]
+                update_status(session_id, f"Query {done}/{len(queries)}: {stats['links']} links in {stats['seconds']}s", link_progress=done/len(queries))
+    # Nothing left to search (resumed after every query finished, or no categories/zipcodes): no browser to lease
+    if todo.empty(): return
+    collectors = max(1, min(int(config.get("collectors", COLLECTOR_BROWSERS)), todo.qsize()))
+    with ThreadPoolExecutor(max_workers=collectors, initializer=bind_session, initargs=(session_id,)) as pool:
+        for f in [pool.submit(collector) for _ in range(collectors)]:
+            try: f.result()
+            except Exception as e: logging.warning(f"[{session_id}] Link collector failed: {type(e).__name__}: {e}")
+
+def scrape_website_selenium(url, headless_mode, proxy=None, max_pages=None):
+    try:
+        with METRICS.span("scrape_website_selenium"), DRIVER_POOL.lease(headless_mode, proxy) as driver:
+            return _scrape_website_selenium(driver, url, max_pages)
+    except Exception as e:
+        logging.warning(f"Browser crawl failed for {url}: {type(e).__name__}: {e}")
         return [], {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
-    finally:
-        if driver: driver.quit()
 
-def scrape_website_data(url, headless_mode, proxy=None):
-    all_emails = set()
-    socials = {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
+def _scrape_website_selenium(driver, url, max_pages=None):
+    driver.set_page_load_timeout(10)
+    driver.get(url)
+    wait_for_page_ready(driver)
+    
+    scanner = ContactScanner(phones=False)
     
+    # Scroll until the page stops growing
+    scroll_until_stable(driver, step=1000, max_scrolls=5, on_scroll=lambda: scanner.scan(driver.page_source))
+    scanner.scan(driver.page_source)
+    
+    # Visit the best-ranked contact pages directly instead of clicking through and going back
     try:
-        session = requests.Session()
-        r = session.get(url, headers={"User-Agent": random.choice(USER_AGENTS)}, timeout=5)
-        if r.status_code == 200:
-            all_emails.update(find_emails(r.text))
-            socials = extract_social_links(r.text)
-            
-            # Check ALL possible contact pages
-            contact_pages = [
-                '/contact', '/contact-us', '/contactus', '/contact_us',
-                '/about', '/about-us', '/aboutus', '/about_us',
-                '/team', '/our-team', '/staff',
-                '/reach-us', '/get-in-touch', '/connect',
-                '/support', '/help', '/info',
-                '/email', '/reach', '/touch'
-            ]
-            
-            for page in contact_pages:
-                try:
-                    contact_url = urllib.parse.urljoin(url, page)
-                    cr = session.get(contact_url, headers={"User-Agent": random.choice(USER_AGENTS)}, timeout=3)
-                    if cr.status_code == 200:
-                        all_emails.update(find_emails(cr.text))
-                except: continue
+        links = driver.execute_script("return Array.from(document.querySelectorAll('a[href], link[rel][href]'), a => [a.getAttribute('href'), a.innerText || a.title || '', a.getAttribute('rel') || '']);")
+        for href in rank_contact_links(driver.current_url, links, max_pages or CONTACT_TOP_K):
+            try:
+                with METRICS.span("website_browser_page"):
+                    driver.get(href)
+                    wait_for_page_ready(driver)
+                    
+                    # Scroll this page too
+                    scroll_until_stable(driver, step=1000, max_scrolls=3)
+                    
+                    scanner.scan(driver.page_source)
+                if len(scanner.emails) >= EMAIL_TARGET: break
+            except Exception as e:
+                logging.debug(f"Browser page failed for {href}: {type(e).__name__}: {e}")
+                continue
+    except Exception as e:
+        logging.warning(f"Browser contact pages failed for {url}: {type(e).__name__}: {e}")
+    
+    return list(scanner.emails), scanner.socials
+
+CONTACT_KEYWORDS = ['contact', 'about', 'team', 'reach', 'connect', 'email', 'support', 'info']
+CONTACT_REL_HINTS = ('contact', 'author', 'help', 'me')
+CONTACT_FALLBACK_PATHS = ['/contact', '/contact-us', '/about']
+CONTACT_TOP_K = 4
+EMAIL_TARGET = 3
+SITEMAP_MAX_URLS = 500
+SITEMAP_LOC_REGEX = re.compile(r'<loc>\s*([^<\s]+)\s*</loc>', re.IGNORECASE)
+NON_HTML_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.pdf', '.css', '.js', '.ico', '.xml', '.zip', '.mp3', '.mp4', '.doc', '.docx')
+HTTP_CRAWL_WORKERS = 8
+SCRIPT_STYLE_REGEX = re.compile(r'<(script|style|noscript)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+JS_SHELL_MARKERS = ('id="root"></div>', 'id="app"></div>', 'id="__next"', 'enable javascript', 'javascript is required', 'requires javascript')
+def looks_js_rendered(html):
+    words = len(TAG_REGEX.sub(' ', SCRIPT_STYLE_REGEX.sub(' ', html)).split())
+    if words < 50: return True
+    lowered = html.lower()
+    return words < 300 and any(m in lowered for m in JS_SHELL_MARKERS)
+
+# Process-wide HTTP client for the website crawl: keep-alive pools shared by every thread and job, cached DNS,
+# HTTP/2 through httpx when it is installed, and bodies read only up to the closing tag or HTTP_MAX_BYTES
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 5))
+HTTP_PAGE_READ_TIMEOUT = float(os.environ.get("HTTP_PAGE_READ_TIMEOUT", 3))
+HTTP_MAX_BYTES = int(os.environ.get("HTTP_MAX_BYTES", 2 * 1024 * 1024))
+HTTP_CHUNK_BYTES = 16384
+HTTP_POOL_HOSTS = 256
+HTTP_POOL_SIZE = 32
+HTTP2 = os.environ.get("HTTP2", "1") == "1"
+HTML_END_MARKERS = (b"</html>", b"</urlset>", b"</sitemapindex>")
+# Crawl-client lookups only (getaddrinfo does not expose record TTLs, so this is a flat, short expiry; 0 turns it off)
+DNS_CACHE_TTL = int(os.environ.get("DNS_CACHE_TTL", 60))
+DNS_CACHE_SIZE = 4096
+HttpPage = namedtuple("HttpPage", "status_code text")
+_dns_cache = {}
+_dns_lock = threading.Lock()
+
+def cached_address(host, port):
+    # First TCP address for host; successful lookups only, failures go back to the resolver every time
+    key = (host, port)
+    now = time.monotonic()
+    with _dns_lock:
+        if (hit := _dns_cache.get(key)) and hit[0] > now: return hit[1]
+    address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+    with _dns_lock:
+        if len(_dns_cache) >= DNS_CACHE_SIZE:
+            for k in [k for k, v in _dns_cache.items() if v[0] <= now]: del _dns_cache[k]
+            if len(_dns_cache) >= DNS_CACHE_SIZE: _dns_cache.clear()
+        _dns_cache[key] = (now + DNS_CACHE_TTL, address)
+    return address
+
+class CachedDNSConnection:
+    # Mixed into the crawl client's urllib3 connections: only the address lookup is cached, and nothing else in the
+    # process is affected. urllib3 derives `host` from _dns_host, so the cached address is swapped in for the socket
+    # connect only and the name is back before TLS, keeping SNI and certificate checks on the hostname
+    def _new_conn(self):
+        if DNS_CACHE_TTL <= 0: return super()._new_conn()
+        name = self._dns_host
+        # A failed lookup is left to urllib3, which raises it as the usual connection error
+        try: self._dns_host = cached_address(name, self.port)
+        except OSError: pass
+        try: return super()._new_conn()
+        finally: self._dns_host = name
+
+class CrawlHTTPConnection(CachedDNSConnection, HTTPConnection): pass
+class CrawlHTTPSConnection(CachedDNSConnection, HTTPSConnection): pass
+class CrawlHTTPPool(HTTPConnectionPool): ConnectionCls = CrawlHTTPConnection
+class CrawlHTTPSPool(HTTPSConnectionPool): ConnectionCls = CrawlHTTPSConnection
+
+class CrawlAdapter(HTTPAdapter):
+    # Proxied requests keep urllib3's own connections; the proxy resolves the site anyway.
+    # The HTTP/2 path needs no cache: each host gets one long-lived multiplexed connection
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CrawlHTTPPool, "https": CrawlHTTPSPool}
+
+class HttpClient:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = CrawlAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.httpx, self.h2_clients = None, {}
+        if HTTP2:
+            try:
+                import httpx, h2
+                self.httpx = httpx
+            except ImportError: pass
+        self.counters = {"requests": 0, "bytes": 0, "truncated": 0, "http2": 0}
+
+    def get(self, url, proxy=None, timeout=None):
+        timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        headers = {"User-Agent": random.choice(USER_AGENTS)}
+        if self.httpx and url.startswith("https://"): return self._get_http2(url, proxy, timeout, headers)
+        proxies = {"http": proxy, "https": proxy} if proxy else None
+        with self.session.get(url, headers=headers, timeout=timeout, proxies=proxies, stream=True) as r:
+            if r.status_code != 200: return HttpPage(r.status_code, None)
+            charset = r.encoding if "charset" in r.headers.get("Content-Type", "").lower() else None
+            return HttpPage(r.status_code, self._read(r.iter_content(HTTP_CHUNK_BYTES), charset))
+
+    def _get_http2(self, url, proxy, timeout, headers):
+        httpx = self.httpx
+        with self.lock:
+            if (client := self.h2_clients.get(proxy)) is None:
+                client = self.h2_clients[proxy] = httpx.Client(http2=True, proxy=proxy or None, follow_redirects=True,
+                                                               limits=httpx.Limits(max_connections=HTTP_POOL_HOSTS, max_keepalive_connections=HTTP_POOL_SIZE))
+            self.counters["http2"] += 1
+        # Mapped onto the requests exceptions the governor already treats as transient
+        try:
+            with client.stream("GET", url, headers=headers, timeout=httpx.Timeout(timeout[1], connect=timeout[0])) as r:
+                if r.status_code != 200: return HttpPage(r.status_code, None)
+                return HttpPage(r.status_code, self._read(r.iter_bytes(HTTP_CHUNK_BYTES), r.charset_encoding))
+        except httpx.TimeoutException as e: raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e: raise requests.ConnectionError(str(e)) from e
+
+    def _read(self, chunks, encoding):
+        # The last few bytes of the previous chunk are rechecked so a marker split across chunks still matches
+        body, truncated = bytearray(), False
+        for chunk in chunks:
+            start = max(0, len(body) - 16)
+            body += chunk
+            if any(m in body[start:].lower() for m in HTML_END_MARKERS): break
+            if len(body) >= HTTP_MAX_BYTES:
+                del body[HTTP_MAX_BYTES:]
+                truncated = True
+                break
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["bytes"] += len(body)
+            self.counters["truncated"] += truncated
+        return body.decode(encoding or "utf-8", "replace")
+
+    def stats(self):
+        with self.lock: return dict(self.counters, dns_cached=len(_dns_cache))
+
+    def close(self):
+        self.session.close()
+        for client in self.h2_clients.values(): client.close()
+
+HTTP_CLIENT = HttpClient()
+atexit.register(HTTP_CLIENT.close)
+
+def fetch_html(url, proxy=None, timeout=None):
+    # Failures (timeouts apart) are counted under the website_page stage; callers log them with their context
+    with METRICS.span("website_page"): page = GOVERNOR.call(url, lambda: HTTP_CLIENT.get(rewrite_url(url), proxy, timeout), GOVERNOR_RETRIES)
+    return page.text if page.status_code == 200 else None
+
+class LinkHintParser(HTMLParser):
+    # Collects (href, text, rel) for every anchor and <link rel> on a page
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self._anchor = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a" and attrs.get("href"):
+            self._anchor = [attrs["href"], attrs.get("title") or "", (attrs.get("rel") or "").lower()]
+        elif tag == "link" and attrs.get("href") and attrs.get("rel"):
+            self.links.append((attrs["href"], "", attrs["rel"].lower()))
+
+    def handle_data(self, data):
+        if self._anchor is not None: self._anchor[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._anchor is not None:
+            self.links.append(tuple(self._anchor))
+            self._anchor = None
+
+def canonical_url(base, href):
+    parts = urllib.parse.urlsplit(urllib.parse.urljoin(base, (href or "").strip()))
+    if parts.scheme not in ("http", "https"): return None
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc.lower(), path, '', ''))
+
+def same_site(a, b):
+    host = lambda u: (urllib.parse.urlsplit(u).hostname or "").removeprefix("www.")
+    return host(a) == host(b)
+
+def contact_score(url, text="", rel=""):
+    path, text = urllib.parse.urlsplit(url).path.lower(), text.lower()
+    score = 0
+    for weight, kw in enumerate(reversed(CONTACT_KEYWORDS), 1):
+        if kw in path: score += 2 * weight
+        if kw in text: score += weight
+    if any(h in rel.split() for h in CONTACT_REL_HINTS): score += len(CONTACT_KEYWORDS)
+    return score
+
+def rank_contact_links(base_url, links, limit=CONTACT_TOP_K):
+    home = canonical_url(base_url, base_url)
+    best = {}
+    for href, text, rel in links:
+        url = canonical_url(base_url, href)
+        if not url or url == home or not same_site(url, base_url) or url.lower().endswith(NON_HTML_EXTENSIONS): continue
+        score = contact_score(url, text, rel)
+        if score > best.get(url, 0): best[url] = score
+    return sorted(best, key=lambda u: (-best[u], u.count('/'), len(u)))[:limit]
+
+def discover_contact_pages(base_url, html, sitemap_xml=None, limit=None):
+    parser = LinkHintParser()
+    try:
+        parser.feed(html)
+        parser.close()
     except: pass
+    links = parser.links + [(loc, "", "") for loc in SITEMAP_LOC_REGEX.findall(sitemap_xml or "")[:SITEMAP_MAX_URLS]]
+    return rank_contact_links(base_url, links, limit or CONTACT_TOP_K)
+
+def crawl_website_http(url, max_pages=None, proxy=None):
+    # Homepage and sitemap together, then only the top-ranked contact pages, all over the shared client
+    email_sources, socials, home_html = {}, {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}, None
+    proxy = pick_proxy(proxy)
+    page_timeout = (HTTP_CONNECT_TIMEOUT, HTTP_PAGE_READ_TIMEOUT)
+    pool = ThreadPoolExecutor(max_workers=HTTP_CRAWL_WORKERS, initializer=bind_session, initargs=(current_session_id(),))
+    try:
+        home_fut = pool.submit(fetch_html, url, proxy)
+        sitemap_fut = pool.submit(fetch_html, urllib.parse.urljoin(url, "/sitemap.xml"), proxy, page_timeout)
+        try: home_html = home_fut.result()
+        except Exception as e: logging.warning(f"Homepage fetch failed for {url}: {type(e).__name__}: {e}")
+        if home_html:
+            home_emails, _, socials = extract_contacts(home_html, phones=False)
+            for e in home_emails: email_sources.setdefault(e, "/")
+        if home_html and len(email_sources) < EMAIL_TARGET:
+            try: sitemap = sitemap_fut.result()
+            except Exception as e:
+                logging.debug(f"Sitemap fetch failed for {url}: {type(e).__name__}: {e}")
+                sitemap = None
+            candidates = discover_contact_pages(url, home_html, sitemap, max_pages) or [urllib.parse.urljoin(url, p) for p in CONTACT_FALLBACK_PATHS[:max_pages or None]]
+            futures = {pool.submit(fetch_html, u, proxy, page_timeout): urllib.parse.urlsplit(u).path or "/" for u in candidates}
+            for fut in as_completed(futures):
+                try: html = fut.result()
+                except Exception as e:
+                    logging.debug(f"Contact page {futures[fut]} failed for {url}: {type(e).__name__}: {e}")
+                    continue
+                if not html: continue
+                for e in find_emails(html): email_sources.setdefault(e, futures[fut])
+                if len(email_sources) >= EMAIL_TARGET: break
+    finally:
+        # Stop as soon as the email target is hit; in-flight fetches are left to finish on their own
+        pool.shutdown(wait=False, cancel_futures=True)
+    return email_sources, socials, home_html is None or looks_js_rendered(home_html)
+
+WEBSITE_BROWSER_DEPTH = {"never": 0, "if_empty": 1, "auto": 2}
+
+def website_depth(max_pages=None, browser="auto"):
+    return {"browser": WEBSITE_BROWSER_DEPTH.get(browser, 2), "pages": max_pages or CONTACT_TOP_K}
+
+def scrape_website_data(url, headless_mode, proxy=None, force_refresh=False, max_pages=None, browser="auto"):
+    key = page_cache_key(url)
+    depth = website_depth(max_pages, browser)
+    if not force_refresh and (hit := cached_result("website", key, depth)): return tuple(hit)
+    with METRICS.span("scrape_website_data"): result = _scrape_website_data(url, headless_mode, proxy, max_pages, browser)
+    RESULT_CACHE.set("website", key, {"depth": depth, "result": result}, empty=not result[0])
+    return result
+
+def _scrape_website_data(url, headless_mode, proxy=None, max_pages=None, browser="auto"):
+    try:
+        with METRICS.span("crawl_website_http"): email_sources, socials, js_rendered = crawl_website_http(url, max_pages, proxy)
+    except Exception as e:
+        logging.warning(f"HTTP crawl failed for {url}: {type(e).__name__}: {e}")
+        email_sources, socials, js_rendered = {}, {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}, True
     
-    # ALWAYS use Selenium for deep scraping
-    selenium_emails, selenium_socials = scrape_website_selenium(url, headless_mode, proxy)
-    all_emails.update(selenium_emails)
-    for k, v in selenium_socials.items():
-        if v and not socials.get(k): socials[k] = v
+    # Only escalate to a browser when the static HTML came up empty or ("auto") is a JS shell
+    used_browser = browser != "never" and (not email_sources or (js_rendered and browser == "auto"))
+    if used_browser:
+        selenium_emails, selenium_socials = scrape_website_selenium(url, headless_mode, proxy, max_pages)
+        for e in selenium_emails: email_sources.setdefault(e, "browser")
+        for k, v in selenium_socials.items():
+            if v and not socials.get(k): socials[k] = v
     
-    return list(all_emails), socials
+    return list(email_sources), socials, {"sources": email_sources, "crawl": "http+browser" if used_browser else "http"}
 
 def extract_facebook_phone(driver):
     phones = set()
@@ -264,92 +1556,77 @@ def extract_facebook_phone(driver):
                 if 'tel:' in text: text = text.replace('tel:', '')
                 found = PHONE_REGEX.findall(text)
                 phones.update(found)
-        except: pass
+        except Exception as e: logging.debug(f"Facebook phone selector {sel} failed: {type(e).__name__}: {e}")
     
     return list(phones)
 
-def scrape_facebook_page(fb_url, headless_mode, proxy=None):
+FACEBOOK_MAX_PAGES = 7
+
+def scrape_facebook_page(fb_url, headless_mode, proxy=None, force_refresh=False, max_pages=None, deadline=None):
     if not fb_url: return [], []
-    driver = None
+    key = page_cache_key(fb_url)
+    depth = {"pages": max_pages or FACEBOOK_MAX_PAGES}
+    if not force_refresh and (hit := cached_result("facebook", key, depth)): return tuple(hit)
     try:
-        opts = Options()
-        opts.add_argument("--no-sandbox")
-        opts.add_argument("--disable-dev-shm-usage")
-        opts.add_argument("--disable-gpu")
-        opts.add_argument(f"--user-agent={random.choice(USER_AGENTS)}")
-        if headless_mode: opts.add_argument("--headless=new")
-        
-        chrome_paths = ["/usr/bin/google-chrome-stable", "/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]
-        for path in chrome_paths:
-            if os.path.exists(path):
-                opts.binary_location = path
-                break
-        
+        with METRICS.span("scrape_facebook_page"), DRIVER_POOL.lease(headless_mode, proxy) as driver:
+            result = _scrape_facebook_page(driver, fb_url, max_pages, deadline)
+    except Exception as e:
+        logging.warning(f"Facebook scrape failed for {fb_url}: {type(e).__name__}: {e}")
+        return [], []
+    # A read cut short by the business's time budget is not a complete result for the page
+    if not (deadline and time.monotonic() > deadline): RESULT_CACHE.set("facebook", key, {"depth": depth, "result": result}, empty=not (result[0] or result[1]))
+    return result
+
+def _scrape_facebook_page(driver, fb_url, max_pages=None, deadline=None):
+    driver.set_page_load_timeout(15)
+    
+    scanner = ContactScanner()
+    dom_phones = set()
+    
+    pages = [
+        fb_url.rstrip('/') + '/about',
+        fb_url.rstrip('/') + '/about_contact_and_basic_info',
+        fb_url.rstrip('/') + '/about_details',
+        fb_url.rstrip('/') + '/about_profile',
+        fb_url.rstrip('/'),
+        fb_url.rstrip('/') + '/posts',
+        fb_url.rstrip('/') + '/reviews'
+    ]
+    
+    for page_url in pages[:max_pages]:
+        # Pages already read are kept when the business's time budget runs out
+        if deadline and time.monotonic() > deadline: break
         try:
-            driver_path = ChromeDriverManager().install()
-        except:
-            try:
-                driver_path = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
-            except:
-                driver_path = "/usr/bin/chromedriver"
-        driver = webdriver.Chrome(service=Service(driver_path), options=opts)
-        driver.set_page_load_timeout(15)
-        
-        all_emails = set()
-        all_phones = set()
-        
-        pages = [
-            fb_url.rstrip('/') + '/about',
-            fb_url.rstrip('/') + '/about_contact_and_basic_info',
-            fb_url.rstrip('/') + '/about_details',
-            fb_url.rstrip('/') + '/about_profile',
-            fb_url.rstrip('/'),
-            fb_url.rstrip('/') + '/posts',
-            fb_url.rstrip('/') + '/reviews'
-        ]
-        
-        for page_url in pages:
-            try:
+            with METRICS.span("facebook_page"):
                 driver.get(page_url)
-                time.sleep(2)
+                wait_until(lambda: driver.find_elements(By.CSS_SELECTOR, 'div[role="main"]'), PAGE_READY_TIMEOUT)
                 
-                # Aggressive scrolling
-                for i in range(10):
-                    driver.execute_script("window.scrollBy(0, 800);")
-                    time.sleep(0.4)
-                    
-                    # Extract on every scroll
-                    html = driver.page_source
-                    all_emails.update(find_emails(html))
-                    all_phones.update(extract_facebook_phone(driver))
-                    all_phones.update(find_phone_numbers(html))
+                # Extract on every scroll, stop once the feed stops growing; an unchanged DOM is not rescanned
+                def extract():
+                    if scanner.scan(driver.page_source): dom_phones.update(extract_facebook_phone(driver))
+                scroll_until_stable(driver, step=800, max_scrolls=10, on_scroll=extract)
                 
                 # Click ALL expandable elements
                 try:
                     clickable = driver.find_elements(By.XPATH, "//div[@role='button'] | //span[contains(text(), 'See')] | //span[contains(text(), 'Show')] | //span[contains(text(), 'More')]")
                     for elem in clickable[:20]:
                         try:
+                            before = driver.execute_script(DOM_SIZE_JS)
                             driver.execute_script("arguments[0].click();", elem)
-                            time.sleep(0.5)
-                            html = driver.page_source
-                            all_emails.update(find_emails(html))
-                            all_phones.update(extract_facebook_phone(driver))
-                        except: pass
-                except: pass
+                            if not wait_for_dom_change(driver, before): continue
+                            extract()
+                        # Buttons going stale or hidden mid-click are routine
+                        except Exception: continue
+                except Exception as e: logging.debug(f"Expanding sections failed on {page_url}: {type(e).__name__}: {e}")
                 
                 # Final extraction
-                html = driver.page_source
-                all_emails.update(find_emails(html))
-                all_phones.update(extract_facebook_phone(driver))
-                all_phones.update(find_phone_numbers(html))
-                
-            except: continue
-        
-        return list(all_emails), list(all_phones)
-    except:
-        return [], []
-    finally:
-        if driver: driver.quit()
+                extract()
+            
+        except Exception as e:
+            logging.warning(f"Facebook page failed for {page_url}: {type(e).__name__}: {e}")
+            continue
+    
+    return list(scanner.emails), list(scanner.phones | dom_phones)
 
 def get_best_email(emails):
     if not emails: return ""
@@ -367,14 +1644,95 @@ def get_domain_matched_email(emails, website_url):
     except: pass
     return get_best_email(emails)
 
-def scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headless_mode, proxy=None):
-    driver = build_chrome(headless_mode, proxy)
+# Maps place panel fields: name -> (CSS selector, what to read). Selector changes are edits to this table only
+MAPS_PLACE_FIELDS = {
+    "name": ('h1.DUwDvf, h1.lfPIob', 'text'),
+    "address": ('button[data-item-id="address"]', 'text'),
+    "phone": ('button[data-item-id^="phone"]', 'text'),
+    "website": ('a[data-item-id="authority"]', 'href'),
+    "category": ('button[jsaction*="category"]', 'text'),
+    "price": ('[aria-label^="Price:"]', 'aria-label'),
+    "rating": ('div.F7nice', 'text'),
+    "hours": ('table.eK4R0e', 'text'),
+}
+SNAPSHOT_JS = """
+const out = {};
+for (const [name, [selector, read]] of Object.entries(arguments[0])) {
+    const el = document.querySelector(selector);
+    out[name] = !el ? '' : read === 'text' ? el.innerText.trim() : read === 'href' ? el.href : (el.getAttribute(read) || '');
+}
+out.html = document.documentElement.outerHTML;
+return out;
+"""
+
+def snapshot_place(driver, fields=MAPS_PLACE_FIELDS):
+    # Every field plus the page HTML in one WebDriver round-trip
+    place = driver.execute_script(SNAPSHOT_JS, fields) or {}
+    return {name: place.get(name) or "" for name in [*fields, "html"]}
+
+# Enrichment after the Maps panel: stage order, when to stop, a per-business time budget and page caps per stage.
+# stop_on: None runs every stage, "any_email" stops at the first usable email, "domain_email" at one on the website's domain
+ENRICHMENT_PRESETS = {
+    "full": {"stages": ["website", "facebook"], "website_browser": "auto", "stop_on": None, "time_budget": None,
+             "max_pages": {"website": CONTACT_TOP_K, "facebook": FACEBOOK_MAX_PAGES}},
+    "fast": {"stages": ["website", "facebook"], "website_browser": "if_empty", "stop_on": "any_email", "time_budget": 45,
+             "max_pages": {"website": 2, "facebook": 2}},
+}
+DEFAULT_ENRICHMENT = "full"
+STOP_ON_DEPTH = {"any_email": 0, "domain_email": 1, None: 2}
+
+def policy_depth(policy):
+    # Cache depth of a place row: stages run, browser fallback, stop condition, time budget and page limits
+    return {"website": int("website" in policy["stages"]), "facebook": int("facebook" in policy["stages"]),
+            "browser": WEBSITE_BROWSER_DEPTH.get(policy["website_browser"], 2), "stop_on": STOP_ON_DEPTH.get(policy["stop_on"], 0),
+            "time_budget": policy["time_budget"] or float("inf"),
+            "website_pages": policy["max_pages"]["website"] or CONTACT_TOP_K, "facebook_pages": policy["max_pages"]["facebook"] or FACEBOOK_MAX_PAGES}
+
+def resolve_policy(config):
+    # config["enrichment"] is a preset name, or a dict of overrides on top of its "preset"
+    spec = (config or {}).get("enrichment") or DEFAULT_ENRICHMENT
+    if isinstance(spec, str): spec = {"preset": spec}
+    base = ENRICHMENT_PRESETS.get(spec.get("preset"), ENRICHMENT_PRESETS[DEFAULT_ENRICHMENT])
+    policy = dict(base, **{k: v for k, v in spec.items() if k in base})
+    policy["max_pages"] = dict(base["max_pages"], **(spec.get("max_pages") or {}))
+    return policy
+
+def is_facebook_url(url):
+    return domain_cache_key(url).endswith("facebook.com")
+
+def enrichment_done(policy, emails, website):
+    if not emails or not policy["stop_on"]: return False
+    if policy["stop_on"] == "any_email": return True
+    domain = domain_cache_key(website)
+    return bool(domain) and any(e.split("@")[-1] == domain or e.endswith("." + domain) for e in emails)
+
+def scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headless_mode, proxy=None, force_refresh=False, policy=None):
+    # A cache hit skips the browser entirely; only the query-specific fields are refreshed
+    key = place_key(gmaps_url)
+    policy = policy or resolve_policy({})
+    depth = policy_depth(policy)
+    if not force_refresh and (hit := cached_result("place", key, depth)):
+        return dict(hit, **{"Search Query": search_query_used, "Zipcode": zipcode, "Enrichment Stages": "cache"})
+    with METRICS.span("scrape_business_entry"): result = _scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headless_mode, proxy, force_refresh, policy)
+    if result.get("Status") == "SCRAPED": RESULT_CACHE.set("place", key, {"depth": depth, "result": result})
+    return result
+
+def _scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headless_mode, proxy=None, force_refresh=False, policy=None):
+    started = time.monotonic()
     try:
-        driver.get(gmaps_url)
-        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'h1.DUwDvf, h1.lfPIob')))
-        time.sleep(1)
+        # Hand the Maps browser back before the website/Facebook stages lease their own
+        with METRICS.span("maps_place"), DRIVER_POOL.lease(headless_mode, proxy) as driver:
+            driver.get(gmaps_url)
+            wait_for_element(driver, By.CSS_SELECTOR, 'h1.DUwDvf, h1.lfPIob', timeout)
+            wait_until(lambda: driver.find_elements(By.CSS_SELECTOR, 'button[data-item-id], a[data-item-id="authority"]'), 1)
         
-        html = driver.page_source
+            # Scroll Google Maps page to load all content
+            panel = driver.find_elements(By.CSS_SELECTOR, 'div[role="main"]')
+            scroll_until_stable(driver, panel[0] if panel else None, 500, 3, 0.3)
+            place = snapshot_place(driver)
+        if not place["name"]: raise ValueError("place name not found")
+        
+        html = place["html"]
         closure_status = "Open"
         if re.search(r'\bPermanently closed\b', html, re.IGNORECASE):
             closure_status = "Permanently Closed"
@@ -382,61 +1740,49 @@ def scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headle
             closure_status = "Temporarily Closed"
         
         place_id = re.search(r'(ChIJ[a-zA-Z0-9_-]+)', gmaps_url).group(0) if re.search(r'(ChIJ[a-zA-Z0-9_-]+)', gmaps_url) else ""
-        name = driver.find_element(By.CSS_SELECTOR, 'h1.DUwDvf, h1.lfPIob').text.strip()
-        address = driver.find_element(By.CSS_SELECTOR, 'button[data-item-id="address"]').text.strip() if driver.find_elements(By.CSS_SELECTOR, 'button[data-item-id="address"]') else ""
-        phone = driver.find_element(By.CSS_SELECTOR, 'button[data-item-id^="phone"]').text.strip() if driver.find_elements(By.CSS_SELECTOR, 'button[data-item-id^="phone"]') else ""
-        website = driver.find_element(By.CSS_SELECTOR, 'a[data-item-id="authority"]').get_attribute("href") if driver.find_elements(By.CSS_SELECTOR, 'a[data-item-id="authority"]') else ""
-        category = driver.find_element(By.CSS_SELECTOR, 'button[jsaction*="category"]').text.strip() if driver.find_elements(By.CSS_SELECTOR, 'button[jsaction*="category"]') else ""
-        price = driver.find_element(By.CSS_SELECTOR, '[aria-label^="Price:"]').get_attribute('aria-label').replace('Price:', '').strip() if driver.find_elements(By.CSS_SELECTOR, '[aria-label^="Price:"]') else ""
+        name, address, phone, website, category = place["name"], place["address"], place["phone"], place["website"], place["category"]
+        price = place["price"].replace('Price:', '').strip()
         
         rating, reviews = "", ""
-        if driver.find_elements(By.CSS_SELECTOR, 'div.F7nice'):
-            txt = driver.find_element(By.CSS_SELECTOR, 'div.F7nice').text.strip()
+        if txt := place["rating"]:
             if m := re.search(r'(\d[.,]\d+)', txt): rating = m.group(1)
             if m := re.search(r'\((\d{1,3}(?:[.,]\d{3})*)\)', txt): reviews = re.sub(r'[.,]', '', m.group(1))
         
-        city, state = "", ""
-        if address:
-            try:
-                tagged, _ = usaddress.tag(address)
-                city = tagged.get('PlaceName', '')
-                state = tagged.get('StateName', '')
-            except:
-                parts = address.split(', ')
-                if len(parts) >= 3: city = parts[-3]; state = parts[-2].split(' ')[0] if len(parts[-2].split(' ')) > 1 else ''
-        
-        # Scroll Google Maps page to load all content
-        for _ in range(3):
-            driver.execute_script("window.scrollBy(0, 500);")
-            time.sleep(0.3)
+        city, state, postal_code = parse_address(address)
         
-        html = driver.page_source
+        # Link hrefs are part of the snapshot HTML, so one scan covers them too
         maps_emails = find_emails(html)
-        
-        # Click on website link in Maps to get more emails
-        try:
-            website_btn = driver.find_elements(By.XPATH, "//a[contains(@href, 'http') and not(contains(@href, 'google'))]")
-            for btn in website_btn[:5]:
-                try:
-                    href = btn.get_attribute('href')
-                    if href and 'facebook' not in href and 'instagram' not in href:
-                        maps_emails.update(find_emails(href))
-                except: pass
-        except: pass
-        
         maps_email = get_best_email(maps_emails)
         logging.info(f"[{name}] Google Maps emails: {maps_emails}")
         
-        website_emails, socials = [], {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
-        if website:
-            website_emails, socials = scrape_website_data(website, headless_mode, proxy)
+        hours = place["hours"].replace('\t', ' ').replace('\n', '; ')
+        
+        website_emails, socials, crawl_info = [], {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}, {"sources": {}, "crawl": ""}
+        fb_emails, fb_phones = [], []
+        # Stages run in policy order until the stop condition or the time budget is hit.
+        # Facebook needs a page URL: a Maps "website" that is a Facebook page, or a link found on the website
+        policy = policy or resolve_policy({})
+        deadline = started + policy["time_budget"] if policy["time_budget"] else None
+        stages, stages_run = list(policy["stages"]), []
+        while stages:
+            stage = stages.pop(0)
+            if enrichment_done(policy, maps_emails + website_emails + fb_emails, website): break
+            if deadline and time.monotonic() > deadline:
+                stages_run.append("budget")
+                break
+            if stage == "website" and website and not is_facebook_url(website):
+                website_emails, socials, crawl_info = scrape_website_data(website, headless_mode, proxy, force_refresh, policy["max_pages"]["website"], policy["website_browser"])
+                stages_run.append("website_browser" if "browser" in crawl_info["crawl"] else "website_http")
+            elif stage == "facebook":
+                fb_url = website if is_facebook_url(website) else socials["Facebook"]
+                if fb_url:
+                    fb_emails, fb_phones = scrape_facebook_page(fb_url, headless_mode, proxy, force_refresh, policy["max_pages"]["facebook"], deadline)
+                    stages_run.append("facebook")
+                elif "website" in stages: stages.append(stage)
+        if is_facebook_url(website) and not socials["Facebook"]: socials["Facebook"] = website
         
         all_website_emails = ", ".join(website_emails)
         website_email = get_domain_matched_email(website_emails, website)
-        
-        fb_emails, fb_phones = [], []
-        if socials["Facebook"]:
-            fb_emails, fb_phones = scrape_facebook_page(socials["Facebook"], headless_mode, proxy)
         fb_email = get_best_email(fb_emails)
         
         insta_email = ""
@@ -452,71 +1798,557 @@ def scrape_business_entry(gmaps_url, search_query_used, zipcode, timeout, headle
         
         all_phones = set([phone] + fb_phones) if phone else set(fb_phones)
         
-        hours = ""
-        try:
-            hours_elem = driver.find_elements(By.CSS_SELECTOR, 'table.eK4R0e')
-            if hours_elem: hours = hours_elem[0].text.replace('\n', '; ')
-        except: pass
-        
         return {
             "Search Query": search_query_used, "Category": category, "Zipcode": zipcode,
-            "City": city, "State": state, "Name": name, "Address": address, 
+            "City": city, "State": state, "Postal Code": postal_code, "Name": name, "Address": address, 
             "Phone": phone, "Facebook Phone": ", ".join(fb_phones), "All Phones": ", ".join(sorted(all_phones)),
             "Website": website, "Facebook": socials["Facebook"], "Instagram": socials["Instagram"],
             "Twitter": socials["Twitter"], "LinkedIn": socials["LinkedIn"],
-            "Google Maps Email": maps_email, "All Website Emails": all_website_emails, "Website Email": website_email, 
+            "Google Maps Email": maps_email, "All Website Emails": all_website_emails, "Website Email": website_email,
+            "Website Email Sources": "; ".join(f"{e} <- {p}" for e, p in crawl_info["sources"].items()), "Website Crawl": crawl_info["crawl"],
             "Facebook Email": fb_email, "Instagram Email": insta_email, 
             "Final Email": final_email,
             "Source": "Facebook" if fb_email and final_email == fb_email else "Website" if website_email and final_email == website_email else "Maps" if maps_email and final_email == maps_email else "Instagram" if final_email else "",
+            "Enrichment Stages": ",".join(stages_run),
+            "Resolved By": "facebook" if fb_email and final_email == fb_email else ("website_browser" if crawl_info["sources"].get(website_email) == "browser" else "website_http") if website_email and final_email == website_email else "maps" if final_email else "",
             "Maps URL": gmaps_url,
             "Place ID": place_id, "Closure Status": closure_status, "Status": "SCRAPED", "Rating": rating, "Reviews Count": reviews,
             "Price Range": price, "Cuisine Types": category, "Opening Hours": hours
         }
     except Exception as e:
+        METRICS.fail(e)
         return {"Maps URL": gmaps_url, "Status": f"ERROR: {str(e)[:50]}"}
-    finally:
-        driver.quit()
 
-def scrape_details(session_id, config):
-    session = get_session(session_id)
-    links = session["collected_links"]
-    update_status(session_id, f"Scraping {len(links)} businesses...", total_to_scrape=len(links))
-    results = []
-    with ThreadPoolExecutor(max_workers=config.get("max_workers", 10)) as pool:
-        futures = {pool.submit(scrape_business_entry, url, query, zipc, config.get("scrape_timeout", 15), config.get("headless_mode", True), config.get("proxy")): (url, query, zipc) for url, query, zipc in links}
-        for i, fut in enumerate(as_completed(futures)):
-            if session["stop_scraping_flag"]: break
-            try: res = fut.result()
-            except: res = None
-            if res: results.append(res)
-            update_status(session_id, f"Scraped {len(results)}/{len(links)}", detail_progress=(i+1)/len(links), scraped_count=len(results))
-    with session["lock"]: session["results_df"] = pd.DataFrame(results)
-
-def scraping_worker(session_id, config):
+class DetailPipeline:
+    # Consumer side of link collection: each link is scraped as soon as a collector hands it over
+    def __init__(self, session_id, config):
+        self.session_id = session_id
+        self.config = config
+        self.policy = resolve_policy(config)
+        self.proxy = proxy_rotation(config)
+        self.session = get_session(session_id)
+        # Reentrant: a callback on an already-finished future runs inside submit()
+        self.lock = threading.RLock()
+        self.futures = []
+        # On resume, links that already have a stored result are skipped
+        self.submitted = JOB_STORE.done_urls(session_id)
+        self.total = self.completed = len(self.submitted)
+        with self.session["lock"]:
+            self.scraped = self.session["scraped_count"]
+            self.session.update(detail_started=time.time(), detail_finished=None, scraped_at_start=self.scraped)
+
+    @cached_property
+    def pool(self):
+        # Created on first use: RemotePipeline never scrapes locally and so never starts one
+        return ThreadPoolExecutor(max_workers=self.config.get("max_workers", 10), initializer=bind_session, initargs=(self.session_id,))
+
+    def submit(self, links):
+        with self.lock:
+            for url, query, zipc in links:
+                if url in self.submitted or self.session["stop_scraping_flag"]: continue
+                self.submitted.add(url)
+                self.total += 1
+                fut = self.pool.submit(self.scrape, url, query, zipc)
+                fut.add_done_callback(lambda f, url=url: self._done(f, url))
+                self.futures.append(fut)
+        self.report()
+
+    def scrape(self, url, query, zipc):
+        return scrape_business_entry(url, query, zipc, self.config.get("scrape_timeout", 15), self.config.get("headless_mode", True), self.proxy, self.config.get("force_refresh", False), self.policy)
+
+    def collect(self):
+        collect_gmaps_links(self.session_id, self.config, self.submit)
+
+    def _done(self, fut, url):
+        if fut.cancelled(): return
+        try: res = fut.result()
+        except: res = None
+        self.complete(url, res)
+
+    def complete(self, url, res):
+        if res:
+            res["Matched Queries"] = matched_queries(self.session_id, url)
+            append_result(self.session_id, url, res)
+            with self.session["lock"]:
+                stats = self.session["enrichment_stats"]
+                stats["businesses"] += 1
+                for stage in filter(None, res.get("Enrichment Stages", "").split(",")): stats["ran"][stage] = stats["ran"].get(stage, 0) + 1
+                resolved = "error" if res.get("Status", "").startswith("ERROR") else res.get("Resolved By") or "unresolved"
+                stats["resolved"][resolved] = stats["resolved"].get(resolved, 0) + 1
+        with self.lock:
+            self.completed += 1
+            if res: self.scraped += 1
+        self.report()
+
+    def report(self):
+        with self.lock: total, completed, scraped = self.total, self.completed, self.scraped
+        update_status(self.session_id, f"Scraped {scraped}/{total}", detail_progress=completed / total if total else 0.0, scraped_count=scraped, total_to_scrape=total)
+
+    def finish(self):
+        # Waits for every submitted link; a stop request cancels whatever has not started yet
+        while True:
+            with self.lock: pending = [f for f in self.futures if not f.done()]
+            if not pending: break
+            if self.session["stop_scraping_flag"]:
+                self.pool.shutdown(wait=True, cancel_futures=True)
+                break
+            wait(pending, timeout=1.0)
+        self.pool.shutdown(wait=True)
+        with self.session["lock"]: self.session["detail_finished"] = time.time()
+
+def job_websites(config):
+    # config["websites"] (a list), plus config["websites_file"] with one URL per line
+    sites = list(config.get("websites") or [])
+    if path := config.get("websites_file"):
+        with open(path, encoding="utf-8") as f: sites += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(s if "://" in s else f"https://{s}" for s in sites))
+
+def scrape_website_row(url, headless_mode, proxy=None, force_refresh=False, max_pages=None, browser="never"):
+    try:
+        emails, socials, crawl_info = scrape_website_data(url, headless_mode, proxy, force_refresh, max_pages, browser)
+        email = get_domain_matched_email(emails, url)
+        stage = "website_browser" if "browser" in crawl_info["crawl"] else "website_http"
+        return {
+            "Website": url, "Facebook": socials["Facebook"], "Instagram": socials["Instagram"], "Twitter": socials["Twitter"], "LinkedIn": socials["LinkedIn"],
+            "All Website Emails": ", ".join(emails), "Website Email": email,
+            "Website Email Sources": "; ".join(f"{e} <- {p}" for e, p in crawl_info["sources"].items()), "Website Crawl": crawl_info["crawl"],
+            "Final Email": email, "Source": "Website" if email else "", "Enrichment Stages": stage,
+            "Resolved By": ("website_browser" if crawl_info["sources"].get(email) == "browser" else "website_http") if email else "", "Status": "SCRAPED"
+        }
+    except Exception as e:
+        METRICS.fail(e)
+        return {"Website": url, "Status": f"ERROR: {str(e)[:50]}"}
+
+class WebsitePipeline(DetailPipeline):
+    # Website-only jobs: the "links" are the configured sites and each one is a plain crawl, no Maps.
+    # The browser fallback is off unless config["website_browser"] asks for it, so these runs never load Selenium
+    def scrape(self, url, query, zipc):
+        return scrape_website_row(url, self.config.get("headless_mode", True), self.proxy, self.config.get("force_refresh", False),
+                                  self.policy["max_pages"]["website"], self.config.get("website_browser", "never"))
+
+    def collect(self):
+        with self.session["lock"]:
+            index = self.session["link_index"]
+            links = [(url, "", "") for url in job_websites(self.config) if place_key(url) not in index]
+            for url, _, _ in links:
+                index[place_key(url)] = len(self.session["collected_links"])
+                self.session["collected_links"].append((url, "", ""))
+            link_count = len(self.session["collected_links"])
+        JOB_STORE.add_links(self.session_id, links)
+        update_status(self.session_id, f"Loaded {link_count} websites", link_progress=1.0, link_count=link_count)
+        self.submit(links)
+
+# Worker mode: the web process only coordinates. Queries and links become tasks in a shared queue that standalone
+# worker processes (python app.py worker) claim, run and report back on
+WORKER_MODE = os.environ.get("WORKER_MODE", "0") == "1" or bool(os.environ.get("TASK_QUEUE_URL"))
+TASK_QUEUE_URL = os.environ.get("TASK_QUEUE_URL", "sqlite:///" + os.path.join(DATA_DIR, "tasks.sqlite3"))
+TASK_LEASE_SECONDS = 300
+TASK_POLL_INTERVAL = 0.5
+TASK_REPORT_BATCH = 500
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 2))
+WORKER_HEARTBEAT_INTERVAL = 5
+WORKER_HEARTBEAT_TIMEOUT = 60
+
+class SqliteTaskQueue:
+    # File-backed queue for workers on one machine or a shared volume. A claim is a lease: a task whose worker died
+    # goes back to the queue once the lease runs out
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _db(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, kind TEXT, payload TEXT, priority INTEGER, worker TEXT, leased_until REAL DEFAULT 0)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_session ON tasks (session_id, kind)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, payload TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS configs (session_id TEXT PRIMARY KEY, config TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, info TEXT, seen REAL)")
+        return self.conn
+
+    @contextmanager
+    def _tx(self):
+        with self.lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try: yield db
+            except:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def start(self, session_id, config):
+        with self._tx() as db:
+            db.execute("DELETE FROM tasks WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM reports WHERE session_id = ?", (session_id,))
+            db.execute("INSERT OR REPLACE INTO configs VALUES (?, ?)", (session_id, json.dumps(config)))
+
+    def load_config(self, session_id):
+        with self.lock: row = self._db().execute("SELECT config FROM configs WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id, kind, payloads, priority=0):
+        if not payloads: return
+        with self._tx() as db: db.executemany("INSERT INTO tasks (session_id, kind, payload, priority) VALUES (?, ?, ?, ?)", [(session_id, kind, json.dumps(p), priority) for p in payloads])
+
+    def claim(self, worker_id):
+        # Queued tasks have leased_until = 0, so expired leases are picked up by the same query
+        now = time.time()
+        with self._tx() as db:
+            row = db.execute("SELECT id, session_id, kind, payload FROM tasks WHERE leased_until < ? ORDER BY priority DESC, id LIMIT 1", (now,)).fetchone()
+            if row: db.execute("UPDATE tasks SET worker = ?, leased_until = ? WHERE id = ?", (worker_id, now + TASK_LEASE_SECONDS, row[0]))
+        return {"id": row[0], "session_id": row[1], "kind": row[2], "payload": json.loads(row[3])} if row else None
+
+    def report(self, session_id, payload):
+        with self.lock: self._db().execute("INSERT INTO reports (session_id, payload) VALUES (?, ?)", (session_id, json.dumps(payload)))
+
+    def finish(self, task, reports):
+        # The final reports and the task's removal land together, so a drained queue never hides a result
+        with self._tx() as db:
+            db.executemany("INSERT INTO reports (session_id, payload) VALUES (?, ?)", [(task["session_id"], json.dumps(r)) for r in reports])
+            db.execute("DELETE FROM tasks WHERE id = ?", (task["id"],))
+
+    def take_reports(self, session_id, limit=TASK_REPORT_BATCH):
+        with self._tx() as db:
+            rows = db.execute("SELECT id, payload FROM reports WHERE session_id = ? ORDER BY id LIMIT ?", (session_id, limit)).fetchall()
+            if rows: db.execute("DELETE FROM reports WHERE session_id = ? AND id <= ?", (session_id, rows[-1][0]))
+        return [json.loads(r[1]) for r in rows]
+
+    def pending(self, session_id):
+        with self.lock: return dict(self._db().execute("SELECT kind, COUNT(*) FROM tasks WHERE session_id = ? GROUP BY kind", (session_id,)).fetchall())
+
+    def purge(self, session_id):
+        with self._tx() as db:
+            db.execute("DELETE FROM tasks WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM reports WHERE session_id = ?", (session_id,))
+
+    def heartbeat(self, worker_id, info):
+        with self.lock: self._db().execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)", (worker_id, json.dumps(info), time.time()))
+
+    def workers(self):
+        with self.lock: rows = self._db().execute("SELECT worker_id, info, seen FROM workers WHERE seen > ?", (time.time() - WORKER_HEARTBEAT_TIMEOUT,)).fetchall()
+        return [dict(json.loads(info), worker_id=worker_id, seen=seen) for worker_id, info, seen in rows]
+
+class RedisTaskQueue:
+    # The same interface over any Redis-protocol server (Redis, Valkey or a local stand-in), for workers on other machines.
+    # Tasks sit in a sorted set by priority; claimed ones move to a second sorted set scored by lease expiry
+    def __init__(self, url, prefix="scraper"):
+        import redis
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def k(self, *parts): return ":".join((self.prefix,) + parts)
+
+    def start(self, session_id, config):
+        self.purge(session_id)
+        self.r.hset(self.k("configs"), session_id, json.dumps(config))
+
+    def load_config(self, session_id):
+        blob = self.r.hget(self.k("configs"), session_id)
+        return json.loads(blob) if blob else None
+
+    def put(self, session_id, kind, payloads, priority=0):
+        if not payloads: return
+        pipe = self.r.pipeline()
+        for p in payloads:
+            task_id = uuid.uuid4().hex
+            pipe.hset(self.k("task"), task_id, json.dumps({"id": task_id, "session_id": session_id, "kind": kind, "payload": p}))
+            pipe.zadd(self.k("queued"), {task_id: time.time() - priority * 1e6})
+            pipe.sadd(self.k("pending", session_id, kind), task_id)
+        pipe.execute()
+
+    def claim(self, worker_id):
+        now = time.time()
+        for task_id in self.r.zrangebyscore(self.k("leased"), 0, now):
+            if self.r.zrem(self.k("leased"), task_id): self.r.zadd(self.k("queued"), {task_id: 0})
+        while popped := self.r.zpopmin(self.k("queued")):
+            task_id = popped[0][0]
+            self.r.zadd(self.k("leased"), {task_id: now + TASK_LEASE_SECONDS})
+            if blob := self.r.hget(self.k("task"), task_id): return json.loads(blob)
+            self.r.zrem(self.k("leased"), task_id)
+        return None
+
+    def report(self, session_id, payload):
+        self.r.rpush(self.k("reports", session_id), json.dumps(payload))
+
+    def finish(self, task, reports):
+        pipe = self.r.pipeline(transaction=True)
+        if reports: pipe.rpush(self.k("reports", task["session_id"]), *[json.dumps(r) for r in reports])
+        pipe.zrem(self.k("leased"), task["id"])
+        pipe.hdel(self.k("task"), task["id"])
+        pipe.srem(self.k("pending", task["session_id"], task["kind"]), task["id"])
+        pipe.execute()
+
+    def take_reports(self, session_id, limit=TASK_REPORT_BATCH):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.lrange(self.k("reports", session_id), 0, limit - 1)
+        pipe.ltrim(self.k("reports", session_id), limit, -1)
+        return [json.loads(r) for r in pipe.execute()[0]]
+
+    def pending(self, session_id):
+        counts = {kind: self.r.scard(self.k("pending", session_id, kind)) for kind in ("query", "link")}
+        return {kind: n for kind, n in counts.items() if n}
+
+    def purge(self, session_id):
+        for kind in ("query", "link"):
+            if task_ids := list(self.r.smembers(self.k("pending", session_id, kind))):
+                self.r.zrem(self.k("queued"), *task_ids)
+                self.r.zrem(self.k("leased"), *task_ids)
+                self.r.hdel(self.k("task"), *task_ids)
+            self.r.delete(self.k("pending", session_id, kind))
+        self.r.delete(self.k("reports", session_id))
+
+    def heartbeat(self, worker_id, info):
+        self.r.hset(self.k("workers"), worker_id, json.dumps(dict(info, seen=time.time())))
+
+    def workers(self):
+        cutoff = time.time() - WORKER_HEARTBEAT_TIMEOUT
+        return [dict(info, worker_id=worker_id) for worker_id, blob in self.r.hgetall(self.k("workers")).items() if (info := json.loads(blob))["seen"] > cutoff]
+
+def task_queue(url=TASK_QUEUE_URL):
+    # sqlite:///relative/path, sqlite:////absolute/path, or redis://host:port/db
+    if url.startswith(("redis://", "rediss://", "unix://")): return RedisTaskQueue(url)
+    return SqliteTaskQueue(url.removeprefix("sqlite:///"))
+
+TASK_QUEUE = task_queue() if WORKER_MODE else None
+
+class RemotePipeline(DetailPipeline):
+    # Coordinator side of worker mode: queries and links are queued instead of run here, and pump() folds the workers'
+    # reports into this job's links, results and progress exactly as the local pipeline would
+    def __init__(self, session_id, config):
+        super().__init__(session_id, config)
+        self.tasks = TASK_QUEUE
+        self.priority = int(config.get("priority", 0))
+        self.finished = set(self.submitted)
+        self.queries_total = self.queries_done = 0
+        self.tasks.start(session_id, config)
+
+    def submit(self, links):
+        payloads = []
+        with self.lock:
+            for url, query, zipc in links:
+                if url in self.submitted or self.session["stop_scraping_flag"]: continue
+                self.submitted.add(url)
+                self.total += 1
+                payloads.append({"url": url, "query": query, "zipcode": zipc})
+        self.tasks.put(self.session_id, "link", payloads, self.priority)
+        self.report()
+
+    def collect(self):
+        queries = job_queries(self.config)
+        done_queries = JOB_STORE.done_queries(self.session_id)
+        self.queries_total, self.queries_done = len(queries), sum(q in done_queries for q, _ in queries)
+        self.tasks.put(self.session_id, "query", [{"query": q, "zipcode": z} for q, z in queries if q not in done_queries], self.priority)
+        self.drain("query")
+
+    def finish(self):
+        self.drain("link")
+        with self.session["lock"]: self.session["detail_finished"] = time.time()
+
+    def drain(self, kind):
+        # Pending counts are read before pumping, so once they reach zero every report is already queued; a pump
+        # applies at most TASK_REPORT_BATCH of them, so the backlog is pumped until a short batch says it is empty
+        while not self.session["stop_scraping_flag"]:
+            pending = self.tasks.pending(self.session_id)
+            applied = self.pump()
+            with self.session["lock"]: self.session["remote"] = {"pending": pending, "workers": len(self.tasks.workers())}
+            checkpoint_session(self.session_id)
+            if not pending.get(kind):
+                while applied >= TASK_REPORT_BATCH: applied = self.pump()
+                return
+            if not applied: time.sleep(TASK_POLL_INTERVAL)
+        self.tasks.purge(self.session_id)
+
+    def pump(self):
+        reports = self.tasks.take_reports(self.session_id)
+        for r in reports:
+            if r["type"] == "links":
+                groups = {}
+                for href, query, zipc in r["links"]: groups.setdefault((query, zipc), []).append(href)
+                for (query, zipc), hrefs in groups.items():
+                    link_count, new_links, _ = record_links(self.session_id, hrefs, query, zipc)
+                    update_status(self.session_id, f"Query \"{query}\": Found {link_count} links", link_count=link_count)
+                    self.submit(new_links)
+            elif r["type"] == "query":
+                stats = r["stats"]
+                METRICS.observe("worker_query", stats.get("seconds", 0.0))
+                if stats["status"] == "ok": JOB_STORE.mark_query_done(self.session_id, stats["query"], stats)
+                self.queries_done += 1
+                update_status(self.session_id, f"Query {self.queries_done}/{self.queries_total}: {stats.get('links', 0)} links in {stats.get('seconds', 0)}s", link_progress=self.queries_done / max(self.queries_total, 1))
+            elif r["type"] == "result" and r["url"] not in self.finished:
+                # A task whose lease expired can be run twice; only the first row counts
+                self.finished.add(r["url"])
+                METRICS.observe("worker_entry", r.get("seconds", 0.0))
+                self.complete(r["url"], r["row"])
+        return len(reports)
+
+def run_task(tasks, task, config):
+    # Returns the task's final reports; a Maps query also streams its links while it scrolls
+    session_id, payload, start = task["session_id"], task["payload"], time.monotonic()
+    headless_mode, proxy = config.get("headless_mode", True), proxy_rotation(config)
+    if task["kind"] == "query":
+        seen = set()
+        def record(hrefs, query, zipc):
+            keyed = {place_key(h): h for h in hrefs if h and "/maps/place/" in h}
+            new_links = [(h, query, zipc) for key, h in keyed.items() if key not in seen]
+            seen.update(keyed)
+            return new_links, set(keyed)
+        on_links = lambda links: tasks.report(session_id, {"type": "links", "links": links})
+        with DRIVER_POOL.lease(headless_mode, proxy) as driver:
+            stats = collect_query(session_id, driver, payload["query"], payload["zipcode"], config, on_links, record)
+        return [{"type": "query", "stats": stats}]
+    row = scrape_business_entry(payload["url"], payload["query"], payload["zipcode"], config.get("scrape_timeout", 15), headless_mode, proxy, config.get("force_refresh", False), resolve_policy(config))
+    return [{"type": "result", "url": payload["url"], "row": row, "seconds": round(time.monotonic() - start, 3)}]
+
+def worker_loop(tasks, worker_id, stop):
+    # One claim loop per browser; a worker process runs several over its own driver pool
+    done, beat = 0, 0.0
+    while not stop.is_set():
+        if time.monotonic() - beat > WORKER_HEARTBEAT_INTERVAL:
+            tasks.heartbeat(worker_id, {"host": socket.gethostname(), "pid": os.getpid(), "done": done})
+            beat = time.monotonic()
+        try: task = tasks.claim(worker_id)
+        except Exception as e:
+            logging.warning(f"[{worker_id}] Claim failed: {type(e).__name__}: {e}")
+            task = None
+        if task is None:
+            stop.wait(TASK_POLL_INTERVAL)
+            continue
+        payload = task["payload"]
+        try: reports = run_task(tasks, task, tasks.load_config(task["session_id"]) or {})
+        except Exception as e:
+            logging.warning(f"[{worker_id}] {task['kind']} task failed: {type(e).__name__}: {e}")
+            if task["kind"] == "query": reports = [{"type": "query", "stats": {"query": payload["query"], "zipcode": payload["zipcode"], "links": 0, "new_links": 0, "seconds": 0.0, "status": f"error: {type(e).__name__}"}}]
+            else: reports = [{"type": "result", "url": payload["url"], "row": {"Maps URL": payload["url"], "Status": f"ERROR: {str(e)[:50]}"}}]
+        tasks.finish(task, reports)
+        done += 1
+
+def worker_process(queue_url, threads):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    tasks = task_queue(queue_url)
+    ident = f"{socket.gethostname()}:{os.getpid()}"
+    loops = [threading.Thread(target=worker_loop, args=(tasks, f"{ident}:{i}", stop), daemon=True) for i in range(threads)]
+    for t in loops: t.start()
+    logging.info(f"Worker {ident} running {threads} loops against {queue_url}")
+    try:
+        while any(t.is_alive() for t in loops): time.sleep(1)
+    except KeyboardInterrupt: stop.set()
+    for t in loops: t.join()
+
+def run_workers(count, threads=WORKER_THREADS, queue_url=TASK_QUEUE_URL):
+    # Separate processes so scraping scales past one interpreter; Ctrl-C or SIGTERM lets running tasks finish
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=worker_process, args=(queue_url, threads), name=f"scraper-worker-{i}") for i in range(count)]
+    for p in procs: p.start()
+    try:
+        for p in procs: p.join()
+    except KeyboardInterrupt:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for p in procs: p.terminate()
+        for p in procs: p.join()
+
+def job_heartbeat(session_id, stop):
+    # Keeps the stored state fresh while nothing reports progress (e.g. every worker is on a slow crawl),
+    # so other processes never mistake a running job for an interrupted one
+    while not stop.wait(JOB_HEARTBEAT_INTERVAL): checkpoint_session(session_id, force=True)
+
+def scraping_worker(session_id, config, resume=False):
     session = get_session(session_id)
+    beat = threading.Event()
+    heartbeat = threading.Thread(target=job_heartbeat, args=(session_id, beat), daemon=True)
+    run = uuid.uuid4().hex
     try:
         with session["lock"]: 
+            session["run"] = run
             session["scraping_active"] = True
             session["stop_scraping_flag"] = False
-            session["results_df"] = pd.DataFrame()
+            session["results"] = []
             session["collected_links"] = []
+            session["link_index"] = {}
+            session["link_matches"] = {}
             session["link_count"] = 0
             session["scraped_count"] = 0
             session["total_to_scrape"] = 0
-        update_status(session_id, "Collecting links...")
-        collect_gmaps_links(session_id, config)
+            session["wait_seconds"] = 0.0
+            session["links_complete"] = False
+            session["detail_started"] = session["detail_finished"] = None
+            session["scraped_at_start"] = 0
+            session["stage_timings"] = {}
+            session["enrichment_stats"] = new_enrichment_stats()
+            session["governor"] = new_governor_stats()
+            session["remote"] = None
+        if resume:
+            stored = JOB_STORE.load_state(session_id) or {}
+            links, results = JOB_STORE.load_links(session_id), JOB_STORE.load_results(session_id)
+            JOB_STORE.clear_stop(session_id)
+            matches = JOB_STORE.load_link_matches(session_id)
+            with session["lock"]:
+                session["collected_links"] = links
+                session["link_index"] = {place_key(url): i for i, (url, _, _) in enumerate(links)}
+                session["link_matches"] = matches
+                # A sink already holds the earlier rows once they are replayed below, so memory stays empty
+                if not session["sink"]: session["results"] = results
+                session["link_count"] = len(links)
+                session["scraped_count"] = len(results)
+                session["links_complete"] = bool(stored.get("links_complete"))
+            if sink := session["sink"]:
+                for row in results: sink(row)
+            del results
+        else:
+            JOB_STORE.start(session_id, config)
+        checkpoint_session(session_id, force=True)
+        heartbeat.start()
+        bind_session(session_id)
+        # Producer/consumer: detail scraping starts on links while collection is still running
+        pipeline = (WebsitePipeline if config.get("websites") or config.get("websites_file") else RemotePipeline if TASK_QUEUE else DetailPipeline)(session_id, config)
+        try:
+            pipeline.submit(list(session["collected_links"]))
+            if not session["links_complete"]:
+                update_status(session_id, "Collecting links...", phase="collecting")
+                with METRICS.span("collect_gmaps_links"): pipeline.collect()
+                if not session["stop_scraping_flag"]:
+                    with session["lock"]: session["links_complete"] = True
+            update_status(session_id, "Scraping details...", phase="scraping")
+        finally:
+            pipeline.finish()
         if not session["stop_scraping_flag"] and session["collected_links"]:
-            update_status(session_id, "Scraping details...")
-            scrape_details(session_id, config)
-            update_status(session_id, "Complete! Ready for next job.")
+            update_status(session_id, "Complete! Ready for next job.", phase="done")
         else:
-            update_status(session_id, "Ready for next job.")
+            update_status(session_id, "Ready for next job.", phase="stopped" if session["stop_scraping_flag"] else "done")
     except Exception as e: 
-        update_status(session_id, f"Error: {e}. Ready for next job.")
+        update_status(session_id, f"Error: {e}. Ready for next job.", phase="error")
     finally:
+        # Stopped first so a late heartbeat cannot overwrite the final checkpoint with an active state
+        beat.set()
+        if heartbeat.is_alive(): heartbeat.join()
+        # Rows go to a compact spill file while the job still counts as active; memory is dropped in the same step
+        # that marks it inactive, so readers switch from memory to disk without a gap.
+        # A job that is no longer the session's current run leaves the state, rows and checkpoint to its successor
+        with session["lock"]: owner = session["run"] == run
+        spilled = None
+        if owner:
+            try: spilled = JOB_STORE.spill(session_id)
+            except Exception as e: logging.warning(f"[{session_id}] Spill failed: {type(e).__name__}: {e}")
         with session["lock"]: 
-            session["scraping_active"] = False
-            session["stop_scraping_flag"] = False
+            owner = session["run"] == run
+            if owner:
+                session["scraping_active"] = False
+                session["stop_scraping_flag"] = False
+                session["run"] = None
+                if spilled is not None: session.update(results=[], collected_links=[], link_index={}, link_matches={})
+            session["version"] += 1
+            session["lock"].notify_all()
+            summary = timing_summary(session["stage_timings"])
+            enrichment = json.dumps(session["enrichment_stats"])
+            governor = json.dumps(session["governor"])
+        if owner:
+            logging.info(f"[{session_id}] Stage timings: {json.dumps(summary)}")
+            logging.info(f"[{session_id}] Enrichment: {enrichment}")
+            logging.info(f"[{session_id}] Request governor: {governor}")
+            checkpoint_session(session_id, force=True)
 
 @app.route("/")
 def index(): return render_template("index.html")
@@ -525,69 +2357,438 @@ def index(): return render_template("index.html")
 def start_scraping():
     session_id = request.headers.get('X-Session-ID', 'default')
     
-    with SESSIONS_LOCK:
-        active_count = sum(1 for s in SESSIONS.values() if s["scraping_active"])
-        if active_count >= MAX_CONCURRENT_SESSIONS:
-            return jsonify({"status": "error", "message": f"Maximum {MAX_CONCURRENT_SESSIONS} concurrent sessions reached. Please wait."}), 200
+    if is_job_running(session_id):
+        return jsonify({"status": "error", "message": "Your session is already scraping. Please wait."}), 200
     
+    config = request.json or {}
+    position = enqueue_job(session_id, config)
+    return jsonify({"status": "success", "message": f"Queued (position {position})" if position else "Started", "queue_position": position})
+
+def enqueue_job(session_id, config, resume=False):
+    # Marked active while queued so the UI keeps polling until the job actually runs
     session = get_session(session_id)
     with session["lock"]:
-        if session["scraping_active"]: 
-            return jsonify({"status": "error", "message": "Your session is already scraping. Please wait."}), 200
-    
-    threading.Thread(target=scraping_worker, args=(session_id, request.json or {}), daemon=True).start()
-    return jsonify({"status": "success", "message": "Started"})
+        session["scraping_active"] = True
+        session["status_message"] = "Queued..."
+        session["phase"] = "queued"
+        session["version"] += 1
+    return SCHEDULER.submit(session_id, int(config.get("priority", 0)), scraping_worker, session_id, config, resume)
+
+def is_job_running(session_id):
+    # Running here (a stopped job counts until its thread has finished), or on another worker with a fresh heartbeat
+    if SCHEDULER.is_running(session_id): return True
+    session = get_session(session_id)
+    with session["lock"]:
+        if session["scraping_active"]: return True
+    stored = JOB_STORE.load_state(session_id)
+    return bool(stored and stored.get("scraping_active"))
+
+def job_state(session_id):
+    session = get_session(session_id)
+    position = SCHEDULER.queue_position(session_id)
+    with session["lock"]:
+        if position: return dict(session_state(session), status_message=f"Queued (position {position})", queue_position=position)
+        if session["scraping_active"]: return session_state(session)
+        local = session_state(session)
+    return JOB_STORE.load_state(session_id) or local
+
+STATUS_FIELDS = ("status_message", "scraping_active", "phase", "link_count", "scraped_count", "total_to_scrape",
+                 "link_collection_progress", "detail_scraping_progress", "wait_seconds", "queue_position", "interrupted", "version", "enrichment_stats", "governor", "remote")
+STATUS_LONG_POLL_MAX = 25
+# A burst of changes (scrolls, finished rows) is answered at most once per interval instead of once per change
+STATUS_MIN_INTERVAL = 1.0
+# Each held long-poll or SSE stream pins a server thread (gunicorn --threads 8 per process). Past this many per process,
+# /status answers at once and /stream-results asks the client to reconnect later, so starts and downloads never starve
+HELD_REQUEST_SLOTS = int(os.environ.get("HELD_REQUEST_SLOTS", "4"))
+HELD_REQUESTS = threading.BoundedSemaphore(HELD_REQUEST_SLOTS)
+
+def status_payload(state):
+    # Counters only; links and rows have their own paginated endpoints
+    data = {k: state[k] for k in STATUS_FIELDS if k in state}
+    rate = 0.0
+    if state.get("detail_started"):
+        elapsed = (state.get("detail_finished") or time.time()) - state["detail_started"]
+        scraped = state.get("scraped_count", 0) - state.get("scraped_at_start", 0)
+        if elapsed > 0 and scraped > 0: rate = scraped / elapsed * 60
+    remaining = max(state.get("total_to_scrape", 0) - state.get("scraped_count", 0), 0)
+    data["throughput_per_min"] = round(rate, 1)
+    data["eta_seconds"] = round(remaining / rate * 60) if rate and state.get("scraping_active") and state.get("phase") == "scraping" else None
+    return data
 
 @app.route("/status")
 def status():
     session_id = request.headers.get('X-Session-ID', 'default')
+    state = job_state(session_id)
+    # Long-poll: with ?wait=S&version=V, hold the request until the state moves past version V
+    wait = min(request.args.get("wait", 0, type=float), STATUS_LONG_POLL_MAX)
+    known = request.args.get("version", type=int)
+    if wait > 0 and known is not None and HELD_REQUESTS.acquire(blocking=False):
+        try:
+            session = get_session(session_id)
+            start = time.monotonic()
+            deadline = start + wait
+            while state.get("version") == known and time.monotonic() < deadline:
+                with session["lock"]: session["lock"].wait(min(1.0, max(deadline - time.monotonic(), 0)))
+                state = job_state(session_id)
+            if state.get("version") != known and time.monotonic() - start < STATUS_MIN_INTERVAL:
+                time.sleep(STATUS_MIN_INTERVAL - (time.monotonic() - start))
+                state = job_state(session_id)
+        finally: HELD_REQUESTS.release()
+    data = status_payload(state)
+    if request.args.get("details"):
+        data.update(driver_pool=DRIVER_POOL.stats(), cache=RESULT_CACHE.stats(), scheduler=SCHEDULER.stats(), stages=METRICS.summary(), memory_bytes=session_memory(get_session(session_id)))
+    return jsonify(data)
+
+@app.route("/timings")
+def timings():
+    # Per-stage timing summary for the session's current (or last) job
+    session_id = request.headers.get('X-Session-ID', 'default')
+    return jsonify(job_state(session_id).get("timings", {}))
+
+@app.route("/metrics")
+def metrics():
+    # Prometheus text exposition for this worker process
+    lines = METRICS.prometheus()
+    if chrome := chrome_processes():
+        lines += ["# TYPE scraper_chrome_processes gauge", f"scraper_chrome_processes {chrome[0]}", "# TYPE scraper_chrome_rss_bytes gauge", f"scraper_chrome_rss_bytes {chrome[1]}"]
+    for name, stats in (("driver_pool", DRIVER_POOL.stats()), ("cache", RESULT_CACHE.stats()), ("scheduler", SCHEDULER.stats()), ("governor", GOVERNOR.stats()), ("http", HTTP_CLIENT.stats()), ("sessions", sessions_stats())):
+        lines.append(f"# TYPE scraper_{name} gauge")
+        lines += [f'scraper_{name}{{key="{k}"}} {v}' for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@app.route("/sessions")
+def sessions():
+    # In-memory sessions on this worker process, most recently used first
+    with SESSIONS_LOCK: current = sorted(SESSIONS.items(), key=lambda item: -item[1].last_access)
+    now = time.monotonic()
+    return jsonify({"max_sessions": MAX_SESSIONS, "ttl_seconds": SESSION_TTL, "sessions": [
+        {"session_id": sid, "active": s["scraping_active"], "idle_seconds": round(now - s.last_access, 1), "results": len(s["results"]),
+         "links": len(s["collected_links"]), "memory_bytes": session_memory(s)} for sid, s in current]})
+
+@app.route("/workers")
+def workers():
+    if TASK_QUEUE is None: return jsonify({"mode": "local", "workers": []})
+    return jsonify({"mode": "queue", "queue": TASK_QUEUE_URL.split("@")[-1], "workers": TASK_QUEUE.workers()})
+
+@app.route("/query-stats")
+def query_stats():
+    # Per-query link yield and timing for the session's current job
+    session_id = request.headers.get('X-Session-ID', 'default')
+    return jsonify(JOB_STORE.load_query_stats(session_id))
+
+@app.route("/links")
+def links():
+    session_id = request.headers.get('X-Session-ID', 'default')
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    page, total = link_page(session_id, offset, limit)
+    end = offset + len(page)
+    return jsonify({"links": [{"url": u, "query": q, "zipcode": z} for u, q, z in page], "total": total, "offset": offset, "next": end if end < total else None})
+
+def link_page(session_id, offset, limit):
     session = get_session(session_id)
-    with session["lock"]: return jsonify({k: v for k, v in session.items() if k not in ["results_df", "lock"]})
+    with session["lock"]:
+        if session["collected_links"] or session["scraping_active"]:
+            return session["collected_links"][offset:offset + limit], len(session["collected_links"])
+    return JOB_STORE.load_links(session_id, offset, limit), JOB_STORE.count_links(session_id)
 
 @app.route("/stop-scraping", methods=["POST"])
 def stop_scraping():
     session_id = request.headers.get('X-Session-ID', 'default')
     session = get_session(session_id)
+    cancelled = SCHEDULER.cancel(session_id)
     with session["lock"]: 
-        session["stop_scraping_flag"] = True
+        session["stop_scraping_flag"] = not cancelled
         session["scraping_active"] = False
+        session["version"] += 1
+        session["lock"].notify_all()
+        if cancelled: session.update(status_message="Ready for next job.", phase="stopped")
+    if not cancelled: JOB_STORE.request_stop(session_id)
     return jsonify({"status": "success", "message": "Stopped"})
 
 @app.route("/get-results")
 def get_results():
     session_id = request.headers.get('X-Session-ID', 'default')
+    if "since" not in request.args: return jsonify(results_rows(session_id))
+    # Cursor mode: only rows after ?since=N, plus the cursor to send next time
+    since = max(request.args.get("since", 0, type=int), 0)
+    rows = results_rows(session_id, since)
+    return jsonify({"rows": rows, "next": since + len(rows)})
+
+STREAM_MAX_SECONDS = 30
+STREAM_BUSY_RETRY_MS = 5000
+
+@app.route("/stream-results")
+def stream_results():
+    # Server-Sent Events: "rows" events carry new result rows, "progress" events the job counters.
+    # Streams end after STREAM_MAX_SECONDS; EventSource reconnects with Last-Event-ID as the cursor.
+    session_id = request.headers.get('X-Session-ID') or request.args.get('session', 'default')
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    cursor = max(cursor if cursor is not None else request.args.get("since", 0, type=int), 0)
     session = get_session(session_id)
-    with session["lock"]: return jsonify(session["results_df"].to_dict(orient="records") if not session["results_df"].empty else [])
+    if not HELD_REQUESTS.acquire(blocking=False):
+        return Response(f"retry: {STREAM_BUSY_RETRY_MS}\n\n", mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+    def events():
+        nonlocal cursor
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        last = None
+        while time.monotonic() < deadline:
+            rows = results_rows(session_id, cursor)
+            if rows:
+                cursor += len(rows)
+                yield f"id: {cursor}\nevent: rows\ndata: {json.dumps(rows)}\n\n"
+            state = job_state(session_id)
+            progress = status_payload(state)
+            if progress != last:
+                last = progress
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            if not state.get("scraping_active"):
+                yield "event: done\ndata: {}\n\n"
+                return
+            with session["lock"]: session["lock"].wait(1.0)
+    response = Response(stream_with_context(events()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Released when the server closes the response, even if the client left before the first event
+    response.call_on_close(HELD_REQUESTS.release)
+    return response
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def export_chunks(rows):
+    # rows is a snapshot list; chunks share one column order and get their addresses normalized in batch
+    import pandas as pd
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    if "Address" in columns: columns += [c for c in ("City", "State", "Postal Code") if c not in columns]
+    for i in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        yield normalize_addresses(pd.DataFrame(rows[i:i + EXPORT_CHUNK_ROWS], columns=columns))
+
+def stream_csv(rows):
+    yield "\ufeff"
+    for i, chunk in enumerate(export_chunks(rows)): yield chunk.to_csv(index=False, header=i == 0)
+
+def stream_jsonl(rows):
+    for chunk in export_chunks(rows): yield chunk.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n"
+
+def write_xlsx(rows, path):
+    # constant_memory flushes each row as it is written instead of keeping the sheet in RAM
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+    sheet = workbook.add_worksheet("Data")
+    r = 0
+    for chunk in export_chunks(rows):
+        if r == 0:
+            sheet.write_row(0, 0, list(chunk.columns))
+            r = 1
+        for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            sheet.write_row(r, 0, values)
+            r += 1
+    workbook.close()
+
+def write_parquet(rows, path):
+    import pyarrow as pa, pyarrow.parquet as pq
+    writer = None
+    try:
+        for chunk in export_chunks(rows):
+            table = pa.Table.from_pandas(chunk.astype("string"), preserve_index=False)
+            writer = writer or pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer: writer.close()
+
+def stream_file(f):
+    while chunk := f.read(65536): yield chunk
+
+def remove_export(f, path):
+    f.close()
+    try: os.remove(path)
+    except OSError: pass
+
+def export_response(session_id, fmt):
+    # results_rows copies the row list under the lock; everything below runs on that snapshot, lock-free
+    rows = results_rows(session_id)
+    if not rows: return "No data", 404
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    name = f"scraped_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
+    if fmt in ("csv", "jsonl"):
+        return Response((stream_csv if fmt == "csv" else stream_jsonl)(rows), mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={name}"})
+    fd, path = tempfile.mkstemp(suffix=f".{ext}", dir=DATA_DIR)
+    os.close(fd)
+    try: (write_xlsx if fmt == "xlsx" else write_parquet)(rows, path)
+    except:
+        os.remove(path)
+        raise
+    f = open(path, "rb")
+    response = Response(stream_file(f), mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={name}", "Content-Length": str(os.path.getsize(path))})
+    # The temp export goes when the server closes the response, which also happens for HEAD requests and
+    # clients that leave before the first chunk (a generator's finally would never run then)
+    response.call_on_close(lambda: remove_export(f, path))
+    return response
 
 @app.route("/download-csv")
 def download_csv():
-    session_id = request.headers.get('X-Session-ID') or request.args.get('session', 'default')
-    session = get_session(session_id)
-    with session["lock"]:
-        if not session["results_df"].empty:
-            buf = io.BytesIO()
-            session["results_df"].to_csv(buf, index=False, encoding="utf-8-sig")
-            buf.seek(0)
-            return send_file(buf, as_attachment=True, download_name=f"scraped_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", mimetype="text/csv")
-    return "No data", 404
+    return export_response(request.headers.get('X-Session-ID') or request.args.get('session', 'default'), "csv")
 
 @app.route("/download-excel")
 def download_excel():
-    session_id = request.headers.get('X-Session-ID') or request.args.get('session', 'default')
-    session = get_session(session_id)
-    with session["lock"]:
-        if not session["results_df"].empty:
-            buf = io.BytesIO()
-            with pd.ExcelWriter(buf, engine="xlsxwriter") as writer: session["results_df"].to_excel(writer, index=False, sheet_name="Data")
-            buf.seek(0)
-            return send_file(buf, as_attachment=True, download_name=f"scraped_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx", mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    return "No data", 404
+    return export_response(request.headers.get('X-Session-ID') or request.args.get('session', 'default'), "xlsx")
+
+@app.route("/download-jsonl")
+def download_jsonl():
+    return export_response(request.headers.get('X-Session-ID') or request.args.get('session', 'default'), "jsonl")
+
+@app.route("/download-parquet")
+def download_parquet():
+    try: import pyarrow
+    except ImportError: return "Parquet export needs pyarrow installed", 501
+    return export_response(request.headers.get('X-Session-ID') or request.args.get('session', 'default'), "parquet")
 
 @app.route("/save-progress", methods=["POST"])
-def save_progress_route(): return jsonify({"status": "success", "message": "Saved"})
+def save_progress_route():
+    # Links and results are checkpointed as they arrive; this just forces the status snapshot out
+    session_id = request.headers.get('X-Session-ID', 'default')
+    session = get_session(session_id)
+    if session["scraping_active"]: checkpoint_session(session_id, force=True)
+    return jsonify({"status": "success", "message": f"Saved {len(JOB_STORE.load_links(session_id))} links, {len(JOB_STORE.done_urls(session_id))} results"})
 
 @app.route("/load-progress", methods=["POST"])
-def load_progress_route(): return jsonify({"status": "success", "message": "Loaded"})
+def load_progress_route():
+    session_id = request.headers.get('X-Session-ID', 'default')
+    config = JOB_STORE.load_config(session_id)
+    if config is None:
+        return jsonify({"status": "error", "message": "No saved job for this session."}), 200
+    if is_job_running(session_id):
+        return jsonify({"status": "error", "message": "Your session is already scraping. Please wait."}), 200
+    position = enqueue_job(session_id, config, resume=True)
+    return jsonify({"status": "success", "message": f"Resume queued (position {position})" if position else "Resuming saved job", "queue_position": position})
+
+# Headless runs: one job in this process, rows appended to a file as they are scraped. Only the HTTP stack is loaded
+# for website-only jobs; Selenium and pandas come in with the first Maps job or web export
+RESULT_COLUMNS = ("Search Query", "Category", "Zipcode", "City", "State", "Postal Code", "Name", "Address", "Phone", "Facebook Phone", "All Phones",
+                  "Website", "Facebook", "Instagram", "Twitter", "LinkedIn", "Google Maps Email", "All Website Emails", "Website Email",
+                  "Website Email Sources", "Website Crawl", "Facebook Email", "Instagram Email", "Final Email", "Source", "Enrichment Stages",
+                  "Resolved By", "Maps URL", "Place ID", "Closure Status", "Status", "Rating", "Reviews Count", "Price Range", "Cuisine Types",
+                  "Opening Hours", "Matched Queries")
+WEBSITE_COLUMNS = ("Website", "Facebook", "Instagram", "Twitter", "LinkedIn", "All Website Emails", "Website Email", "Website Email Sources",
+                   "Website Crawl", "Final Email", "Source", "Enrichment Stages", "Resolved By", "Status")
+RUN_FORMATS = ("csv", "jsonl", "parquet")
+RUN_PROGRESS_INTERVAL = 5
+
+class RowWriter:
+    # Appends rows to a CSV, JSONL or Parquet file; shared by the pipeline threads. CSV and JSONL are flushed per row,
+    # Parquet is written in EXPORT_CHUNK_ROWS row groups of strings
+    def __init__(self, path, columns, fmt=None):
+        self.fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+        if self.fmt not in RUN_FORMATS: raise ValueError(f"Unsupported output format {self.fmt!r}, expected one of {', '.join(RUN_FORMATS)}")
+        self.path, self.columns = path, list(columns)
+        self.lock = threading.Lock()
+        self.rows, self.pending = 0, []
+        self.file = self.writer = None
+        if self.fmt == "parquet":
+            import pyarrow as pa, pyarrow.parquet as pq
+            self.schema = pa.schema([(c, pa.string()) for c in self.columns])
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+            if self.fmt == "csv":
+                self.file.write("\ufeff")
+                self.writer = csv.DictWriter(self.file, self.columns, restval="", extrasaction="ignore")
+                self.writer.writeheader()
+
+    def write(self, row):
+        with self.lock:
+            self.rows += 1
+            if self.fmt == "csv": self.writer.writerow(row)
+            elif self.fmt == "jsonl": self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            else:
+                self.pending.append(row)
+                if len(self.pending) >= EXPORT_CHUNK_ROWS: self._write_group()
+            if self.file: self.file.flush()
+
+    def _write_group(self):
+        import pyarrow as pa
+        rows = [{c: None if row.get(c) is None else str(row[c]) for c in self.columns} for row in self.pending]
+        self.writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        self.pending = []
+
+    def close(self):
+        with self.lock:
+            if self.fmt == "parquet":
+                if self.pending: self._write_group()
+                self.writer.close()
+            else: self.file.close()
+
+def run_job(config=None, output=None, fmt=None, job_id="cli", resume=False, workers=None, on_row=None):
+    # Library entry point: runs a job to completion in this process and returns its final state.
+    # Rows go to `output` and/or on_row(row) as they arrive; resume continues job_id from the job store,
+    # replaying its stored rows first. Ctrl-C stops the job cleanly, leaving it resumable
+    if resume: config = JOB_STORE.load_config(job_id) or config
+    if not config: raise ValueError(f"No saved job {job_id!r} to resume" if resume else "A job config is required")
+    config = dict(config)
+    if workers: config["max_workers"] = workers
+    columns = WEBSITE_COLUMNS if config.get("websites") or config.get("websites_file") else RESULT_COLUMNS
+    writer = RowWriter(output, columns, fmt) if output else None
+    def sink(row):
+        if writer: writer.write(row)
+        if on_row: on_row(row)
+    session = get_session(job_id)
+    with session["lock"]:
+        if session["scraping_active"]: raise RuntimeError(f"Job {job_id!r} is already running")
+        session["sink"] = sink
+    # Waits on an Event rather than Thread.join, which can report a still-running thread as finished after a Ctrl-C
+    done = threading.Event()
+    def run():
+        try: scraping_worker(job_id, config, resume)
+        finally: done.set()
+    try:
+        threading.Thread(target=run, name=f"job-{job_id}", daemon=True).start()
+        while not done.is_set():
+            try:
+                if done.wait(RUN_PROGRESS_INTERVAL): break
+            except KeyboardInterrupt:
+                logging.info(f"[{job_id}] Stopping; run again with --resume to continue")
+                with session["lock"]: session["stop_scraping_flag"] = True
+                continue
+            with session["lock"]: message, scraped, total = session["status_message"], session["scraped_count"], session["total_to_scrape"]
+            logging.info(f"[{job_id}] {message} ({scraped}/{total})")
+    finally:
+        with session["lock"]: session["sink"] = None
+        if writer: writer.close()
+    return job_state(job_id)
+
+def run_main(argv):
+    parser = argparse.ArgumentParser(prog="app.py run", description="Run one scraping job without the web UI, streaming rows to a file")
+    parser.add_argument("config", nargs="?", help="job config JSON (the /start-scraping body); optional with --resume")
+    parser.add_argument("-o", "--output", help="output file; .csv, .jsonl or .parquet")
+    parser.add_argument("--format", choices=RUN_FORMATS, help="output format when the extension does not say")
+    parser.add_argument("--job-id", default="cli", help="job store key, used by --resume")
+    parser.add_argument("--resume", action="store_true", help="continue the stored job instead of starting over")
+    parser.add_argument("--workers", type=int, help="businesses or websites scraped at once (config max_workers)")
+    args = parser.parse_args(argv)
+    if not args.config and not args.resume: parser.error("a job config is required unless --resume is given")
+    config = None
+    if args.config:
+        with open(args.config, encoding="utf-8") as f: config = json.load(f)
+    # The import-time config suits server logs; a terminal run gets the shorter format
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", force=True)
+    try: state = run_job(config, args.output, args.format, args.job_id, args.resume, args.workers)
+    except (ValueError, RuntimeError) as e: parser.error(str(e))
+    print(json.dumps(status_payload(state)))
+    return 1 if state.get("phase") == "error" else 0
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    if sys.argv[1:2] == ["worker"]:
+        parser = argparse.ArgumentParser(prog="app.py worker", description="Run standalone scraping workers against the task queue")
+        parser.add_argument("--workers", type=int, default=1, help="worker processes to start")
+        parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="tasks (browsers) run at once per process")
+        parser.add_argument("--queue", default=TASK_QUEUE_URL, help="sqlite:///path or redis://host:port/db")
+        args = parser.parse_args(sys.argv[2:])
+        run_workers(args.workers, args.threads, args.queue)
+    elif sys.argv[1:2] == ["run"]:
+        sys.exit(run_main(sys.argv[2:]))
+    else:
+        app.run(host="0.0.0.0", port=5000, debug=True)
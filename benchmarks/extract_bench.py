@@ -0,0 +1,103 @@
+"""Micro-benchmark: single-pass contact extraction vs the previous per-signal functions.
+
+    python benchmarks/extract_bench.py [--pages N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+PHONE_REGEX = re.compile(r'(\+?\d[\d\s\-\(\)]{8,})')
+EMAIL_REGEX = re.compile(r"[a-zA-Z0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}")
+
+# Previous implementations, kept verbatim as the baseline
+def legacy_find_emails(html):
+    if not html: return []
+    html = html.lower().replace('[at]','@').replace('(at)','@').replace('[dot]','.').replace('(dot)','.').replace(' at ','@').replace(' dot ','.')
+    emails = EMAIL_REGEX.findall(html)
+    invalid_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.pdf', '.css', '.js', '.ico']
+    invalid_domains = ['sentry.io', 'example.com', 'test.com', 'localhost', 'w3.org', 'schema.org', 'google.com', 'facebook.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com', 'youtube.com', 'maps.google.com']
+    invalid_keywords = ['noreply', 'no-reply', 'donotreply', 'mailer-daemon', 'postmaster', 'webmaster', 'abuse', 'spam', 'privacy', 'support@example', 'info@example', 'contact@example']
+    valid_emails = []
+    for e in emails:
+        e = e.strip().lower()
+        if e.count('@') != 1: continue
+        if any(ext in e for ext in invalid_extensions): continue
+        local, domain = e.split('@')
+        if len(local) < 2 or len(domain) < 4: continue
+        if any(kw in local for kw in invalid_keywords): continue
+        if any(d in domain for d in invalid_domains): continue
+        if not '.' in domain: continue
+        valid_emails.append(e)
+    return sorted(set(valid_emails))
+
+def legacy_find_phone_numbers(html): return list(set([m.strip() for m in PHONE_REGEX.findall(re.sub(r'<[^>]+>', ' ', html)) if len(re.sub(r'[^\d]','',m))>=10]))
+
+def legacy_extract_social_links(html):
+    socials = {"Facebook": "", "Instagram": "", "Twitter": "", "LinkedIn": ""}
+    patterns = {"Facebook": r'https?://(?:www\.)?facebook\.com/[^\s"\'\'<>]+', "Instagram": r'https?://(?:www\.)?instagram\.com/[^\s"\'\'<>]+', "Twitter": r'https?://(?:www\.)?(?:twitter|x)\.com/[^\s"\'\'<>]+', "LinkedIn": r'https?://(?:[a-z]{2,3}\.)?linkedin\.com/[^\s"\'\'<>]+'}
+    for k, p in patterns.items():
+        m = re.findall(p, html, re.IGNORECASE)
+        if m: socials[k] = m[0].split('?')[0].rstrip('/')
+    return socials
+
+WORDS = "the our menu is open daily from nine at the corner fresh local coffee team about contact hours order call us today".split()
+
+def make_page(rng, size_kb):
+    # Roughly shaped like a business homepage: lots of markup and prose, a few contacts and profile links
+    parts = []
+    while sum(map(len, parts)) < size_kb * 1024:
+        parts.append(f'<div class="c{rng.randint(0, 99)}"><p>{" ".join(rng.choices(WORDS, k=40))}</p></div>')
+        if rng.random() < 0.1: parts.append('<img srcset="/img/logo@2x.png 2x" src="/img/logo.png">')
+        if rng.random() < 0.05: parts.append(f'<a href="mailto:info{rng.randint(0, 9)}@shop{rng.randint(0, 9)}.com">Email</a>')
+        if rng.random() < 0.05: parts.append(f'<span>Call <b>(555) {rng.randint(100, 999)}-{rng.randint(1000, 9999)}</b></span>')
+        if rng.random() < 0.02: parts.append('<a href="https://www.facebook.com/shop?ref=page">fb</a><a href="https://instagram.com/shop/">ig</a>')
+        if rng.random() < 0.02: parts.append('<p>write to sales [at] shop [dot] com or noreply@shop.com</p>')
+    return "<html><body>" + "".join(parts) + "</body></html>"
+
+def bench(label, fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in pages: fn(html)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<44} {best * 1000:9.1f} ms   {best / len(pages) * 1e6:9.1f} us/page")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--snapshots", type=int, default=10, help="page_source reads per page in the scroll/click loop")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    pages = [make_page(rng, args.size_kb) for _ in range(args.pages)]
+
+    # Output differences are expected only for obfuscated emails with spaces ("sales [at] shop [dot] com")
+    old_emails = {(i, e) for i, html in enumerate(pages) for e in legacy_find_emails(html)}
+    new_emails = {(i, e) for i, html in enumerate(pages) for e in app.find_emails(html)}
+    other = sum(1 for html in pages if set(legacy_find_phone_numbers(html)) != set(app.find_phone_numbers(html)) or legacy_extract_social_links(html) != app.extract_social_links(html))
+    print(f"{args.pages} pages x {args.size_kb} KB: {len(new_emails - old_emails)} emails only found by the new extractor, {len(old_emails - new_emails)} only by legacy, {other} pages with differing phones/socials\n")
+
+    old = bench("legacy: emails + phones + socials", lambda h: (legacy_find_emails(h), legacy_find_phone_numbers(h), legacy_extract_social_links(h)), pages, args.repeat)
+    new = bench("extract_contacts (single pass)", app.extract_contacts, pages, args.repeat)
+    print(f"{'speedup':<44} {old / new:9.2f}x\n")
+
+    # The Facebook loop reads page_source after every scroll and click; most snapshots are identical
+    def legacy_loop(h):
+        for _ in range(args.snapshots): legacy_find_emails(h); legacy_find_phone_numbers(h)
+    def scanner_loop(h):
+        scanner = app.ContactScanner()
+        for _ in range(args.snapshots): scanner.scan(h)
+    old = bench(f"legacy: {args.snapshots} snapshots per page", legacy_loop, pages, args.repeat)
+    new = bench(f"ContactScanner: {args.snapshots} snapshots per page", scanner_loop, pages, args.repeat)
+    print(f"{'speedup':<44} {old / new:9.2f}x")
+
+if __name__ == "__main__":
+    main()
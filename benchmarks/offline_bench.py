@@ -0,0 +1,222 @@
+"""Offline throughput benchmark: runs the scraper against local stand-ins for Maps, business websites and Facebook.
+
+    python benchmarks/offline_bench.py                      # full job through Chrome (needs Chrome + chromedriver)
+    python benchmarks/offline_bench.py --http-only          # HTTP website crawl only, no browser
+    python benchmarks/offline_bench.py --json out.json --baseline base.json --tolerance 0.2
+
+Pages are rendered from benchmarks/fixtures/*.html, which mirror the DOM the scraper reads (feed cards, the place
+panel, contact pages, Facebook about pages). Every site gets its own port so per-host limits and per-site request
+counts behave as they would against real domains. The scraper runs in a throwaway working directory, so its cache
+and job store start empty, and force_refresh keeps results from being served across sites that share 127.0.0.1.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+WORDS = "fresh local family owned since serving the best neighborhood daily specials catering events order online".split()
+
+def load_fixtures():
+    return {name[:-5]: string.Template(open(os.path.join(FIXTURES, name), encoding="utf-8").read()) for name in os.listdir(FIXTURES) if name.endswith(".html")}
+
+def filler(i, words):
+    return " ".join(WORDS[(i * 7 + k * 3) % len(WORDS)] for k in range(words))
+
+class Fixtures:
+    # Place i has one website; i % 4 picks where its email lives: 0 homepage, 1 contact page, 2 client-rendered, 3 Facebook
+    def __init__(self, queries, per_query, batch, delay_ms):
+        self.templates = load_fixtures()
+        self.queries, self.per_query, self.batch, self.delay_ms = queries, per_query, batch, delay_ms
+        self.step = max(1, per_query * 3 // 4)  # neighbouring queries share a quarter of their places
+        self.places = (queries - 1) * self.step + per_query
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.main_port = None
+        self.site_ports = []
+
+    def count(self, key):
+        with self.lock: self.requests[key] = self.requests.get(key, 0) + 1
+
+    def place(self, i):
+        return {
+            "name": f"Bench Place {i}", "rating": f"{3 + i % 20 / 10:.1f}", "reviews": f"{100 + i * 7:,}", "category": "Restaurant",
+            "address": f"{100 + i} Main St, Springfield, IL 627{i % 100:02d}", "phone": f"(217) 555-{i % 10000:04d}", "phone_digits": f"+1217555{i % 10000:04d}",
+            "website": f"http://127.0.0.1:{self.site_ports[i]}/", "filler": filler(i, 400),
+            "href": f"http://127.0.0.1:{self.main_port}/maps/place/Bench+Place+{i}/data=!4m7!3m6!1s0x0:0x{i:x}!8m2!3d0!4d0!19sChIJbench{i:06d}",
+        }
+
+    def email(self, i): return f"hello{i}@benchplace{i}.com"
+
+    def maps(self, path):
+        if path.startswith("/maps/search/"):
+            self.count("maps_search")
+            query = urllib.parse.unquote_plus(path[len("/maps/search/"):])
+            q = int(m.group(1)) if (m := re.search(r"cat(\d+)", query)) else 0
+            places = [self.place(i) for i in range(q * self.step, min(q * self.step + self.per_query, self.places))]
+            return self.templates["maps_search"].substitute(query=query, places=json.dumps([{"name": p["name"], "href": p["href"]} for p in places]), batch=self.batch, delay_ms=self.delay_ms)
+        if path.startswith("/maps/place/"):
+            self.count("maps_place")
+            i = int(m.group(1)) if (m := re.search(r"ChIJbench(\d+)", path)) else 0
+            return self.templates["maps_place"].substitute(self.place(i))
+        if path.startswith("/fb/"):
+            self.count("facebook")
+            i = int(m.group(1)) if (m := re.search(r"benchplace(\d+)", path)) else 0
+            contact = f'<div><span>Contact info</span><a href="mailto:{self.email(i)}">{self.email(i)}</a><span>+1 217-555-{i % 10000:04d}</span></div>' if "about" in path else ""
+            return self.templates["facebook"].substitute(name=f"Bench Place {i}", filler=filler(i, 200), fb_contact=contact)
+        return None
+
+    def site(self, i, path):
+        self.count(("site", i))
+        variant, email, name = i % 4, self.email(i), f"Bench Place {i}"
+        mail = f'<p>Email: <a href="mailto:{email}">{email}</a></p>'
+        social = f'<a href="https://www.facebook.com/benchplace{i}">Facebook</a>' if variant == 3 else ""
+        if path in ("/", ""):
+            if variant == 2:
+                local, domain = email.split("@")
+                return self.templates["site_js"].substitute(name=name, email_local=local, email_domain=domain)
+            return self.templates["site_home"].substitute(name=name, filler=filler(i, 600), home_contact=mail if variant == 0 else "", social=social)
+        if path.rstrip("/") in ("/contact", "/about-us"):
+            return self.templates["site_contact"].substitute(name=name, filler=filler(i, 200), page_contact=mail if variant == 1 else "<p>Call us any time.</p>")
+        return None
+
+def serve(handler_fn):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = handler_fn(urllib.parse.urlsplit(self.path).path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        def log_message(self, *args): pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_servers(fixtures):
+    servers = [serve(lambda path, i=i: fixtures.site(i, path)) for i in range(fixtures.places)]
+    fixtures.site_ports = [s.server_address[1] for s in servers]
+    main = serve(fixtures.maps)
+    fixtures.main_port = main.server_address[1]
+    return [main] + servers
+
+class MemorySampler:
+    # Peak RSS of this process (getrusage) and of Chrome processes, sampled from /proc while the run is going
+    def __init__(self, app, interval=0.5):
+        self.app, self.interval = app, interval
+        self.peak_chrome_rss = self.peak_chrome_processes = 0
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            if chrome := self.app.chrome_processes():
+                self.peak_chrome_processes = max(self.peak_chrome_processes, chrome[0])
+                self.peak_chrome_rss = max(self.peak_chrome_rss, chrome[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+
+def run_full(app, fixtures, args):
+    config = {"general_search_term": "bench", "categories": [f"cat{q}" for q in range(fixtures.queries)], "zipcodes": ["62701"],
+              "max_workers": args.workers, "collectors": args.collectors, "headless_mode": True, "force_refresh": True}
+    start = time.monotonic()
+    app.scraping_worker("bench", config)
+    elapsed = time.monotonic() - start
+    rows = app.results_rows("bench")
+    entries = sum(1 for r in rows if r.get("Status") == "SCRAPED")
+    lease = app.DRIVER_POOL.stats()["lease_seconds"]
+    return {"entries": entries, "with_email": sum(1 for r in rows if r.get("Final Email")), "elapsed_seconds": round(elapsed, 2),
+            "entries_per_min": round(entries / elapsed * 60, 1) if elapsed else 0.0, "browser_seconds_per_entry": round(lease / entries, 2) if entries else None}
+
+def run_http_only(app, fixtures, args):
+    sites = [f"http://127.0.0.1:{port}/" for port in fixtures.site_ports]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool: results = list(pool.map(app.crawl_website_http, sites))
+    elapsed = time.monotonic() - start
+    return {"entries": len(sites), "with_email": sum(1 for sources, _, _ in results if sources), "elapsed_seconds": round(elapsed, 2),
+            "entries_per_min": round(len(sites) / elapsed * 60, 1) if elapsed else 0.0, "browser_seconds_per_entry": 0.0}
+
+def compare(report, baseline, tolerance):
+    # Fails on a throughput drop or a browser-time increase beyond tolerance
+    failures = []
+    if baseline.get("entries_per_min") and report["entries_per_min"] < baseline["entries_per_min"] * (1 - tolerance):
+        failures.append(f"entries/min {report['entries_per_min']} < baseline {baseline['entries_per_min']}")
+    if baseline.get("browser_seconds_per_entry") and (report["browser_seconds_per_entry"] or 0) > baseline["browser_seconds_per_entry"] * (1 + tolerance):
+        failures.append(f"browser-seconds/entry {report['browser_seconds_per_entry']} > baseline {baseline['browser_seconds_per_entry']}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--per-query", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=7, help="cards added to the feed per scroll")
+    parser.add_argument("--delay-ms", type=int, default=150, help="simulated feed loading delay")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--collectors", type=int, default=2)
+    parser.add_argument("--http-only", action="store_true", help="benchmark the HTTP website crawl only (no Chrome needed)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report JSON to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fixtures = Fixtures(args.queries, args.per_query, args.batch, args.delay_ms)
+    servers = start_servers(fixtures)
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="scraper-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import app
+    app.URL_REWRITES[:] = [("https://www.google.com/maps", f"http://127.0.0.1:{fixtures.main_port}/maps"), ("https://www.facebook.com", f"http://127.0.0.1:{fixtures.main_port}/fb")]
+
+    with MemorySampler(app) as memory:
+        result = (run_http_only if args.http_only else run_full)(app, fixtures, args)
+    for s in servers: s.shutdown()
+    app.DRIVER_POOL.shutdown()
+    os.chdir(cwd)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    site_requests = [fixtures.requests.get(("site", i), 0) for i in range(fixtures.places)]
+    report = dict(result, mode="http-only" if args.http_only else "full", places=fixtures.places, queries=fixtures.queries,
+                  http_requests_per_site=round(sum(site_requests) / len(site_requests), 2),
+                  maps_requests={k: v for k, v in fixtures.requests.items() if isinstance(k, str)},
+                  peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                  peak_chrome_rss_mb=round(memory.peak_chrome_rss / 2**20, 1), peak_chrome_processes=memory.peak_chrome_processes,
+                  stages=app.METRICS.summary())
+
+    for key in ("mode", "places", "entries", "with_email", "elapsed_seconds", "entries_per_min", "browser_seconds_per_entry", "http_requests_per_site", "peak_rss_mb", "peak_chrome_rss_mb", "peak_chrome_processes"):
+        print(f"{key:<28} {report[key]}")
+    for stage, t in sorted(report["stages"].items()):
+        print(f"  {stage:<26} n={t['count']:<5} p50={t['p50']}s p95={t['p95']}s errors={t['errors']} timeouts={t['timeouts']}")
+    if args.json:
+        with open(os.path.join(cwd, args.json), "w") as f: json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(os.path.join(cwd, args.baseline)) as f: failures = compare(report, json.load(f), args.tolerance)
+        for failure in failures: print(f"REGRESSION: {failure}")
+        if failures: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
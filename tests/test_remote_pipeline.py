@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_app(tmp_path, monkeypatch):
+    # app keeps its data under ./scraper_data, so it is imported from a scratch directory
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module("app")
+    tasks = app.SqliteTaskQueue(str(tmp_path / "tasks.sqlite3"))
+    monkeypatch.setattr(app, "TASK_QUEUE", tasks)
+    monkeypatch.setattr(app, "JOB_STORE", app.JobStore(str(tmp_path / "jobs.sqlite3")))
+    return app, tasks
+
+
+def place(i):
+    return f"https://www.google.com/maps/place/P{i}/data=!19sChIJtest{i:06d}"
+
+
+def test_finish_applies_more_reports_than_one_batch(tmp_path, monkeypatch):
+    app, tasks = load_app(tmp_path, monkeypatch)
+    count = app.TASK_REPORT_BATCH + 100
+    app.JOB_STORE.start("big", {})
+    pipeline = app.RemotePipeline("big", {})
+    pipeline.submit([(place(i), "q", "62701") for i in range(count)])
+    while task := tasks.claim("w"):
+        tasks.finish(task, [{"type": "result", "url": task["payload"]["url"], "row": {"Maps URL": task["payload"]["url"], "Status": "SCRAPED"}}])
+    pipeline.finish()
+    assert pipeline.scraped == count
+    assert len(app.JOB_STORE.done_urls("big")) == count
+    assert tasks.take_reports("big") == []
+
+
+def test_query_drain_applies_every_links_report(tmp_path, monkeypatch):
+    app, tasks = load_app(tmp_path, monkeypatch)
+    count = app.TASK_REPORT_BATCH + 100
+    config = {"categories": ["c"], "zipcodes": ["62701"]}
+    app.JOB_STORE.start("links", config)
+    pipeline = app.RemotePipeline("links", config)
+    monkeypatch.setattr(pipeline, "submit", lambda links: None)
+    query = app.job_queries(config)[0][0]
+    tasks.put("links", "query", [{"query": query, "zipcode": "62701"}])
+    task = tasks.claim("w")
+    for i in range(count): tasks.report("links", {"type": "links", "links": [[place(i), query, "62701"]]})
+    tasks.finish(task, [{"type": "query", "stats": {"query": query, "zipcode": "62701", "links": count, "new_links": count, "seconds": 0.0, "status": "ok"}}])
+    pipeline.drain("query")
+    assert app.get_session("links")["link_count"] == count
+    assert app.JOB_STORE.count_links("links") == count